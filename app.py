@@ -1,18 +1,42 @@
-from models import db, User, Menu, MenuItem, Order, OrderItem, Reservation, Review, Schedule
-from flask import Flask, request, jsonify, make_response
+from models import (
+    db, ORDER_STATUSES, User, Menu, MenuItem, CatalogueVersion, ListingVersion, AvailabilityWindow, Order, OrderItem, Reservation, Review, Schedule, ReportJob,
+    ArchivedOrder, ArchivedOrderItem, ArchivedReservation, ArchivedReview,
+)
+from menu_import import CSV_FIELDS, read_rows, validate_rows
+from exports import EXPORTS, stream_csv, stream_ndjson
+import search
+import changes
+from archive import run_archive
+from money import to_minor
+from reports import REPORTS, month_range, run_worker
+from write_behind import WriteBehindQueue
+from events import EventBroker
+from idempotency import IdempotencyStore
+from availability import MenuSnapshot
+from listing_cache import ListingCache
+from traffic import TrafficRecorder
+from replicas import ReplicaRouter
+from authz import ROLE_PERMISSIONS, issue_access_token, permission_cache, permission_required
+from flask import Flask, Response, request, jsonify, make_response, send_file, stream_with_context
 from flask_migrate import Migrate
 from flask_jwt_extended import ( 
-    JWTManager, jwt_required, create_access_token, get_jwt, get_jwt_identity, create_refresh_token
+    JWTManager, jwt_required, get_jwt, get_jwt_identity, create_refresh_token
 )
 from flask_cors import CORS
 from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
 from werkzeug.utils import secure_filename
+from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
 
 
+import click
+import json
 import secrets
 import os
 
@@ -22,16 +46,143 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fud.db'
+DEFAULT_DATABASE_URI = 'sqlite:///fud.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URI)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=7) 
 app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=7)   
-
-
+app.config["JWT_TOKEN_LOCATION"] = ["headers"]
+app.config['ORDER_EVENTS_BACKEND'] = os.environ.get('ORDER_EVENTS_BACKEND', 'local')
+app.config['ARCHIVE_HORIZON_DAYS'] = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 365))
+app.config['READ_REPLICA_URIS'] = [uri for uri in os.environ.get('READ_REPLICA_URIS', '').split(',') if uri]
+app.config['READ_REPLICA_DEBUG'] = os.environ.get('READ_REPLICA_DEBUG') == '1'
+app.config['REPORTS_DIR'] = os.environ.get('REPORTS_DIR', os.path.join(app.instance_path, 'reports'))
+# Longer than the slowest report; a job running past it is handed to
+# another worker.
+app.config['REPORTS_JOB_TIMEOUT'] = int(os.environ.get('REPORTS_JOB_TIMEOUT', 30 * 60))
+app.config['MENU_TIMEZONE'] = os.environ.get('MENU_TIMEZONE')
+app.config['TRAFFIC_RECORD_PATH'] = os.environ.get('TRAFFIC_RECORD_PATH')
+app.config['TRAFFIC_RECORD_SALT'] = os.environ.get('TRAFFIC_RECORD_SALT')
+app.config['WRITE_BEHIND_ENABLED'] = os.environ.get('WRITE_BEHIND_ENABLED') == '1'
+app.config['PERMISSION_CACHE_TTL'] = float(os.environ.get('PERMISSION_CACHE_TTL', 5))
+
+
+replica_router = ReplicaRouter(app)
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=search.include_object)
 jwt = JWTManager(app)
+write_behind = WriteBehindQueue(app)
+order_events = EventBroker(app)
+listing_cache = ListingCache(app)
+idempotency = IdempotencyStore(app)
+menu_snapshot = MenuSnapshot(app)
+traffic_recorder = TrafficRecorder(app)
+permission_cache.init_app(app)
+
+
+def publish_order_event(order):
+    event = order.status_event()
+    order_events.publish('orders', event)
+    order_events.publish(f'orders.user.{order.user_id}', event)
+
+
+# Builders run inside the worker's batch transaction, so the listing
+# version moves when the row lands, not when it is queued.
+@write_behind.register('review')
+def build_review(payload):
+    MenuItem.adjust_rating(payload.get('menu_item_id'), 1, payload['rating'])
+    ListingVersion.bump(payload['user_id'], 'reviews')
+    return Review(**payload)
+
+
+@write_behind.after_commit
+def refresh_menu_ratings(kinds):
+    if 'review' in kinds:
+        menu_snapshot.invalidate()
+
+
+@write_behind.register('reservation')
+def build_reservation(payload):
+    payload = dict(payload, reservation_time=datetime.fromisoformat(payload['reservation_time']))
+    ListingVersion.bump(payload['user_id'], 'reservations')
+    return Reservation(**payload)
+
+
+@app.before_request
+def start_write_behind():
+    # The worker drains anything left in the outbox on its first pass,
+    # which is what replays writes acknowledged before a crash.
+    if write_behind.enabled:
+        write_behind.start()
+
+
+@app.cli.command('search-reindex')
+def search_reindex():
+    with db.engine.begin() as connection:
+        search.create_indexes(connection, rebuild=True)
+    print("Search indexes rebuilt")
+
+
+@app.cli.command('ratings-reconcile')
+def ratings_reconcile():
+    updated = MenuItem.reconcile_ratings()
+    db.session.commit()
+    print(f"Rebuilt rating aggregates for {updated} menu items")
+
+
+@app.cli.command('order-totals-reconcile')
+def order_totals_reconcile():
+    updated = Order.reconcile_totals()
+    db.session.commit()
+    print(f"Corrected totals for {updated} orders")
+
+
+@app.cli.command('archive')
+@click.option('--days', type=int, default=None, help='Archive rows older than this many days.')
+@click.option('--batch-size', type=int, default=1000)
+def archive_history(days, batch_size):
+    days = days if days is not None else app.config['ARCHIVE_HORIZON_DAYS']
+    moved = run_archive(days, batch_size=batch_size)
+    # Every worker's cached listings may include rows that just moved.
+    ListingVersion.bump(None)
+    db.session.commit()
+    print(", ".join(f"{count} {table}" for table, count in moved.items()) + f" archived (older than {days} days)")
+
+
+@app.cli.command('bootstrap-admin')
+@click.argument('email')
+def bootstrap_admin(email):
+    # The only way to get the first admin: signup always creates customers
+    # and every other role change goes through PATCH /users/<id>/role.
+    if User.query.filter_by(role='admin').first():
+        raise click.ClickException("An admin already exists; use PATCH /users/<id>/role")
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f"No user with email {email}")
+    user.role = 'admin'
+    user.role_version += 1
+    db.session.commit()
+    print(f"{email} is now an admin")
+
+
+@app.cli.command('replicas-sync')
+def replicas_sync():
+    for url in replica_router.sync_sqlite(db.engine):
+        print(f"Copied primary to {url}")
+
+
+@app.cli.command('reports-worker')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--interval', type=float, default=2.0)
+def reports_worker(once, interval):
+    run_worker(app.config['REPORTS_DIR'], interval=interval, once=once, timeout=app.config['REPORTS_JOB_TIMEOUT'])
+
+
+@app.cli.command('write-behind-flush')
+def write_behind_flush():
+    applied = write_behind.flush()
+    print(f"Applied {applied} queued writes")
 
 
 
@@ -46,45 +197,65 @@ def allowed_file(filename):
 
 
 
-@app.route('/signup', methods=['POST'])
-def signup():
+def unique_violation(error):
+    # Which unique column an IntegrityError on users tripped over. SQLite
+    # names the column ("users.email"), Postgres the key ("Key (email)=...").
+    message = str(error.orig)
+    for field in ('email', 'phone_number'):
+        if field in message:
+            return field
+    return None
+
+
+def create_account(role, label):
+    # No lookup before the insert: the unique indexes on email and
+    # phone_number decide, so two concurrent signups can't both succeed.
+    # The picture is written only once the row is known to be valid. The
+    # role comes from the route, never from the client.
     name = request.form.get('name')
     email = request.form.get('email')
     phone_number = request.form.get('phone_number')
     password = request.form.get('password')
-    role = request.form.get('role', 'customer')
+
+    if not (name and email and phone_number and password):
+        return jsonify({'message': 'name, email, phone_number and password are required'}), 400
 
     profile_picture_file = request.files.get('profile_picture')
-    
-    
-    if profile_picture_file and allowed_file(profile_picture_file.filename):
-        filename = secure_filename(profile_picture_file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        profile_picture_file.save(filepath)
-        profile_picture_url = f"/{filepath}" 
-    else:
+    if not (profile_picture_file and allowed_file(profile_picture_file.filename)):
         return jsonify({'message': 'Invalid or missing profile picture'}), 400
 
+    filename = f"{secrets.token_hex(8)}_{secure_filename(profile_picture_file.filename)}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
-    if User.query.filter((User.name == name) | (User.email == email)).first():
-        return jsonify({'message': 'User already exists'}), 400
-
-    
     user = User(
         name=name,
         email=email,
         phone_number=phone_number,
-        profile_picture=profile_picture_url,
+        profile_picture=f"/{filepath}",
         role=role
     )
     user.set_password(password)
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({'message': f'{label} already exists', 'field': unique_violation(e)}), 400
 
-    access_token = create_access_token(identity=int(user.id))
+    try:
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        profile_picture_file.save(filepath)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+    access_token = issue_access_token(user)
 
     return jsonify({
-        'message': 'User created successfully',
+        'message': f'{label} created successfully',
         'access_token': access_token,
         'user': {
             'id': user.id,
@@ -97,6 +268,11 @@ def signup():
     }), 200
 
 
+@app.route('/signup', methods=['POST'])
+def signup():
+    return create_account('customer', 'User')
+
+
 @app.route('/login', methods=['POST'])
 def login(refresh=True):
     data = request.get_json()
@@ -107,7 +283,7 @@ def login(refresh=True):
     if not user or not user.check_password(password):
         return jsonify({'msg': 'Invalid credentials'}), 401
     
-    access_token = create_access_token(identity=str(user.id))
+    access_token = issue_access_token(user)
     refresh_token = create_refresh_token(identity=str(user.id))
 
     
@@ -120,110 +296,77 @@ def login(refresh=True):
 
 
 @app.route('/admin/signup', methods=['POST'])
+@jwt_required()
+@permission_required('users:manage')
 def admin_signup():
-    name = request.form.get('name')
-    email = request.form.get('email')
-    phone_number = request.form.get('phone_number')
-    password = request.form.get('password')
-    role = request.form.get('role', 'admin')
-
-    profile_picture_file = request.files.get('profile_picture')
-    
-    
-    if profile_picture_file and allowed_file(profile_picture_file.filename):
-        filename = secure_filename(profile_picture_file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        profile_picture_file.save(filepath)
-        profile_picture_url = f"/{filepath}"  
-    else:
-        return jsonify({'message': 'Invalid or missing profile picture'}), 400
-
-  
-    if User.query.filter((User.name == name) | (User.email == email)).first():
-        return jsonify({'message': 'Admin already exists'}), 400
-
-  
-    user = User(
-        name=name,
-        email=email,
-        phone_number=phone_number,
-        profile_picture=profile_picture_url,
-        role=role
-    )
-    user.set_password(password)
-    db.session.add(user)
-    db.session.commit()
-
-    access_token = create_access_token(identity=int(user.id))
-
-    return jsonify({
-        'message': 'Admin created successfully',
-        'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'phone_number': user.phone_number,
-            'profile_picture': user.profile_picture,
-            'role': user.role
-        }
-    }), 200
-
-
-
+    return create_account('admin', 'Admin')
 
 
 @app.route('/staff/signup', methods=['POST'])
+@jwt_required()
+@permission_required('users:manage')
 def staff_signup():
-    name = request.form.get('name')
-    email = request.form.get('email')
-    phone_number = request.form.get('phone_number')
-    password = request.form.get('password')
-    role = request.form.get('role', 'staff')
-
-    profile_picture_file = request.files.get('profile_picture')
-    
-    
-    if profile_picture_file and allowed_file(profile_picture_file.filename):
-        filename = secure_filename(profile_picture_file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        profile_picture_file.save(filepath)
-        profile_picture_url = f"/{filepath}"  
-    else:
-        return jsonify({'message': 'Invalid or missing profile picture'}), 400
-
-    
-    if User.query.filter((User.name == name) | (User.email == email)).first():
-        return jsonify({'message': 'Staff already exists'}), 400
-
-    user = User(
-        name=name,
-        email=email,
-        phone_number=phone_number,
-        profile_picture=profile_picture_url,
-        role=role
-    )
-    user.set_password(password)
-    db.session.add(user)
-    db.session.commit()
-
-    access_token = create_access_token(identity=int(user.id))
-
-    return jsonify({
-        'message': 'Staff created successfully',
-        'access_token': access_token,
-        'user': {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'phone_number': user.phone_number,
-            'profile_picture': user.profile_picture,
-            'role': user.role
-        }
-    }), 200
+    return create_account('staff', 'Staff')
 
 
+@app.route('/staff/bulk', methods=['POST'])
+@jwt_required()
+@permission_required('users:manage')
+def bulk_onboard_staff():
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get('staff')
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "Expected a non-empty JSON list of staff"}), 400
+    if len(rows) > 500:
+        return jsonify({"error": "At most 500 staff per request"}), 400
+
+    users, errors = [], []
+    seen = {'email': set(), 'phone_number': set()}
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'row must be an object'})
+            continue
+        missing = [field for field in ('name', 'email', 'phone_number', 'password') if not row.get(field)]
+        if missing:
+            errors.append({'row': index, 'error': f"missing {', '.join(missing)}"})
+            continue
+        duplicate = [field for field in seen if row[field] in seen[field]]
+        if duplicate:
+            errors.append({'row': index, 'error': f"duplicate {', '.join(duplicate)} in request"})
+            continue
+        for field in seen:
+            seen[field].add(row[field])
+        users.append({
+            'name': row['name'],
+            'email': row['email'],
+            'phone_number': row['phone_number'],
+            'password': generate_password_hash(row['password']),
+            'profile_picture': row.get('profile_picture') or '',
+            'role': 'staff',
+        })
+    if errors:
+        return jsonify({"error": "Validation failed", "rows": errors}), 422
 
+    try:
+        ids = db.session.scalars(insert(User).returning(User.id), users).all()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # Only on failure: find which rows collided with existing accounts.
+        taken = db.session.query(User.email, User.phone_number).filter(
+            User.email.in_(seen['email']) | User.phone_number.in_(seen['phone_number'])
+        ).all()
+        emails = {email for email, _ in taken}
+        phones = {phone for _, phone in taken}
+        conflicts = [
+            {'row': index, 'email': user['email'], 'phone_number': user['phone_number']}
+            for index, user in enumerate(users, start=1)
+            if user['email'] in emails or user['phone_number'] in phones
+        ]
+        return jsonify({"error": "Some staff already have accounts", "rows": conflicts}), 409
+
+    return jsonify({"created": len(ids), "ids": ids}), 201
 
 
 @app.route('/logout', methods=['POST'])
@@ -258,61 +401,348 @@ def get_me():
 @app.route('/menu', methods=['GET'])
 @jwt_required()
 def get_menus():
-    menus = Menu.query.all()
-    return jsonify([menu.to_dict() for menu in menus]), 200
+    # Served from the precomputed snapshot; "available" already accounts
+    # for availability windows at the current time.
+    key = 'menu_available' if request.args.get('available') == 'true' else 'menu'
+    return Response(menu_snapshot.current().payloads[key], mimetype='application/json'), 200
 
 
 @app.route('/menu_items', methods=['GET'])
 @jwt_required()
 def get_menu_items():
-    items = MenuItem.query.all()
-    return jsonify([item.to_dict() for item in items]), 200
+    key = 'menu_items_available' if request.args.get('available') == 'true' else 'menu_items'
+    return Response(menu_snapshot.current().payloads[key], mimetype='application/json'), 200
+
+
+def with_current_availability(items):
+    # MenuItem.available is only the manual flag; anything that returns menu
+    # item dicts outside the snapshot reports the same answer as /menu_items.
+    available = menu_snapshot.current().payloads['available_item_ids']
+    return (dict(item, available=item['id'] in available) for item in items)
 
 
 @app.route('/menu_items/<int:id>', methods=['GET'])
 @jwt_required()
 def get_menu_item(id):
     item = MenuItem.query.get_or_404(id)
-    return jsonify(item.to_dict())
+    # Same answer as /menu_items: the flag combined with availability windows.
+    available = item.id in menu_snapshot.current().payloads['available_item_ids']
+    return jsonify(dict(item.to_dict(), available=available))
 
 
 
 @app.route('/menu-items/<int:id>', methods=['DELETE'])
 @jwt_required()
+@permission_required('menu:write')
 def delete_menu_item(id):
     item = MenuItem.query.get_or_404(id)
+    AvailabilityWindow.query.filter_by(menu_item_id=id).delete()
     db.session.delete(item)
+    CatalogueVersion.bump()
     db.session.commit()
+    menu_snapshot.invalidate()
     return '', 204
 
 
 @app.route('/menu-items', methods=['POST'])
 @jwt_required()
+@permission_required('menu:write')
 def create_menu_item():
     data = request.get_json()
+    try:
+        price_cents = to_minor(data['price'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     new_item = MenuItem(
         name=data['name'],
         description=data['description'],
-        price=data['price'],
+        price_cents=price_cents,
         available=data['available'],
         image_url=data.get('image_url'),
         menu_id=data['menu_id']
     )
     db.session.add(new_item)
+    CatalogueVersion.bump()
     db.session.commit()
+    menu_snapshot.invalidate()
     return jsonify(new_item.to_dict()), 201
 
 
+@app.route('/menu-items/bulk', methods=['POST'])
+@jwt_required()
+@permission_required('menu:write')
+def bulk_import_menu_items():
+    upsert = request.args.get('upsert', 'true').lower() != 'false'
+    try:
+        rows = read_rows(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    menu_ids = {menu_id for (menu_id,) in db.session.query(Menu.id)}
+    items, errors = validate_rows(rows, menu_ids)
+    if errors:
+        return jsonify({"error": "Validation failed", "rows": errors}), 422
+    if not items:
+        return jsonify({"error": "No items supplied"}), 400
+
+    existing = {}
+    if upsert:
+        touched = db.session.query(MenuItem.id, MenuItem.menu_id, MenuItem.name).filter(
+            MenuItem.menu_id.in_({item['menu_id'] for item in items})
+        )
+        existing = {(menu_id, name): item_id for item_id, menu_id, name in touched}
+
+    inserts = []
+    updates = []
+    for item in items:
+        item_id = existing.get((item['menu_id'], item['name']))
+        if item_id is None:
+            inserts.append(item)
+        else:
+            updates.append(dict(item, id=item_id))
+
+    try:
+        if inserts:
+            db.session.execute(insert(MenuItem), inserts)
+        if updates:
+            db.session.execute(update(MenuItem), updates)
+        version = CatalogueVersion.bump()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Bulk import failed", "details": str(e)}), 500
+    menu_snapshot.invalidate()
+
+    return jsonify({
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "catalogue_version": version
+    }), 200
+
+
+@app.route('/availability-windows', methods=['GET'])
+@jwt_required()
+def get_availability_windows():
+    windows = AvailabilityWindow.query.order_by(AvailabilityWindow.id).all()
+    return jsonify([window.to_dict() for window in windows]), 200
+
+
+@app.route('/availability-windows', methods=['POST'])
+@jwt_required()
+@permission_required('menu:write')
+def create_availability_window():
+    data = request.get_json() or {}
+    menu_id = data.get('menu_id')
+    menu_item_id = data.get('menu_item_id')
+    if (menu_id is None) == (menu_item_id is None):
+        return jsonify({"error": "Exactly one of menu_id or menu_item_id is required"}), 400
+    if menu_id is not None and not db.session.get(Menu, menu_id):
+        return jsonify({"error": "Menu not found"}), 404
+    if menu_item_id is not None and not db.session.get(MenuItem, menu_item_id):
+        return jsonify({"error": "Menu item not found"}), 404
+
+    days = str(data.get('days', '0123456'))
+    if not days or set(days) - set('0123456'):
+        return jsonify({"error": "days must be a string of weekday digits 0-6, Monday = 0"}), 400
+    try:
+        start_time = datetime.strptime(data['start_time'], "%H:%M").time()
+        end_time = datetime.strptime(data['end_time'], "%H:%M").time()
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "start_time and end_time are required as HH:MM"}), 400
+
+    window = AvailabilityWindow(
+        menu_id=menu_id,
+        menu_item_id=menu_item_id,
+        days=''.join(sorted(set(days))),
+        start_time=start_time,
+        end_time=end_time
+    )
+    db.session.add(window)
+    CatalogueVersion.bump()
+    db.session.commit()
+    menu_snapshot.invalidate()
+    return jsonify(window.to_dict()), 201
+
+
+@app.route('/availability-windows/<int:id>', methods=['DELETE'])
+@jwt_required()
+@permission_required('menu:write')
+def delete_availability_window(id):
+    window = AvailabilityWindow.query.get_or_404(id)
+    db.session.delete(window)
+    CatalogueVersion.bump()
+    db.session.commit()
+    menu_snapshot.invalidate()
+    return '', 204
+
+
+@app.route('/menu-items/export', methods=['GET'])
+@jwt_required()
+def export_menu_items():
+    items = MenuItem.query.order_by(MenuItem.menu_id, MenuItem.id).yield_per(500)
+    rows = with_current_availability(item.to_dict() for item in items)
+    return Response(
+        stream_with_context(stream_csv(rows, CSV_FIELDS)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=menu_items.csv'}
+    )
+
+
 
 @app.route("/orders/user/<int:user_id>", methods=["GET"])
 @jwt_required()
 def get_orders_by_user(user_id):
-    orders = Order.query.filter_by(user_id=user_id).all()
+    def build():
+        orders = Order.query.filter_by(user_id=user_id).all()
+        return with_archived(ArchivedOrder, user_id, [order.to_dict() for order in orders])
+    return cached_listing('orders', user_id, build)
+
+
+@app.route("/orders/user/<int:user_id>/recent", methods=["GET"])
+@jwt_required()
+def get_recent_orders_by_user(user_id):
+    try:
+        limit = min(int(request.args.get('limit', 5)), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    # Walks ix_orders_user_id_created_at backwards and stops after `limit`
+    # rows; items are fetched for just those orders in one more query.
+    orders = (
+        Order.query.filter_by(user_id=user_id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .options(joinedload(Order.user), selectinload(Order.items))
+        .limit(max(limit, 1))
+        .all()
+    )
     return jsonify([order.to_dict() for order in orders]), 200
 
 
+@app.route('/orders/<int:id>/reorder', methods=['POST'])
+@jwt_required()
+@idempotency.idempotent
+def reorder(id):
+    order = Order.query.options(selectinload(Order.items)).get_or_404(id)
+    if str(order.user_id) != str(get_jwt_identity()):
+        return jsonify({"error": "You can only reorder your own orders"}), 403
+
+    menu_items = {
+        item.id: item
+        for item in MenuItem.query.filter(MenuItem.id.in_({line.menu_item_id for line in order.items}))
+    }
+    available = menu_snapshot.current().payloads['available_item_ids']
+    lines, skipped = [], []
+    for line in order.items:
+        menu_item = menu_items.get(line.menu_item_id)
+        if menu_item is None or line.menu_item_id not in available:
+            skipped.append(line.menu_item_id)
+        else:
+            lines.append((menu_item, line.quantity))
+    if not lines:
+        return jsonify({"error": "None of the items in this order are available", "skipped": skipped}), 409
+
+    try:
+        new_order = Order(user_id=order.user_id, total_cents=0)
+        db.session.add(new_order)
+        db.session.flush()
+        db.session.add_all([
+            OrderItem(order_id=new_order.id, menu_item_id=menu_item.id, quantity=quantity, price_cents=menu_item.price_cents)
+            for menu_item, quantity in lines
+        ])
+        new_order.total_cents = sum(menu_item.price_cents * quantity for menu_item, quantity in lines)
+        ListingVersion.bump(new_order.user_id, 'orders')
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": "Failed to place order", "details": str(e)}), 500
+
+    publish_order_event(new_order)
+    return jsonify(dict(new_order.to_dict(), reordered_from=order.id, skipped=skipped)), 201
+
+
+def flush_pending_writes(user_id):
+    # Read-your-writes for queued writes: applying them bumps the listing
+    # version, so a cached copy from before the write is not served.
+    if write_behind.enabled and write_behind.has_pending(user_id):
+        write_behind.flush()
+
+
+def cached_listing(kind, user_id, build):
+    archived = request.args.get('include_archived', '').lower() in ('1', 'true')
+    body, hit = listing_cache.get_or_build(kind, user_id, archived, build)
+    response = Response(body, mimetype='application/json')
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response, 200
+
+
+@app.route('/cache/stats', methods=['GET'])
+@jwt_required()
+@permission_required('metrics:read')
+def cache_stats():
+    return jsonify({"listings": listing_cache.metrics()}), 200
+
+
+def with_archived(archive, user_id, rows):
+    # Archived history is only read when the client asks for it, so the
+    # default listings stay on the small live tables.
+    if request.args.get('include_archived', '').lower() not in ('1', 'true'):
+        return rows
+    archived = archive.query.filter_by(user_id=user_id).all()
+    return [dict(row.to_dict(), archived=True) for row in archived] + rows
+
+
+@app.route('/orders/<int:id>/status', methods=['PATCH'])
+@jwt_required()
+@permission_required('orders:update_status')
+def update_order_status(id):
+    order = Order.query.get_or_404(id)
+    status = (request.get_json() or {}).get('status')
+    if status not in ORDER_STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(ORDER_STATUSES)}"}), 400
+
+    if status != order.status:
+        order.status = status
+        ListingVersion.bump(order.user_id, 'orders')
+        db.session.commit()
+        publish_order_event(order)
+
+    return jsonify(order.status_event()), 200
+
+
+# EventSource can't send headers, so the two SSE streams (and only they)
+# also accept ?jwt=<token>. Everywhere else a token in the URL would end up
+# in access logs and Referer headers.
+#
+# These two views serve the dev server and WSGI deployments; asgi.py answers
+# the same paths itself, which is what production streams should run on
+# (see gunicorn.conf.py).
+SSE_TOKEN_LOCATIONS = ['headers', 'query_string']
+
+
+@app.route('/orders/stream', methods=['GET'])
+@jwt_required(locations=SSE_TOKEN_LOCATIONS)
+@permission_required('orders:read_all')
+def stream_orders():
+    return event_stream_response(order_events.stream('orders'))
+
+
+@app.route('/orders/user/<int:user_id>/stream', methods=['GET'])
+@jwt_required(locations=SSE_TOKEN_LOCATIONS)
+def stream_orders_by_user(user_id):
+    return event_stream_response(order_events.stream(f'orders.user.{user_id}'))
+
+
+def event_stream_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/order_items', methods=['POST'])
 @jwt_required()
+@idempotency.idempotent
 def create_order_item():
     data = request.get_json()
 
@@ -326,10 +756,12 @@ def create_order_item():
     menu_item = MenuItem.query.get(menu_item_id)
     if not menu_item:
         return jsonify({"error": "Menu item not found"}), 404
+    if menu_item.id not in menu_snapshot.current().payloads['available_item_ids']:
+        return jsonify({"error": "Menu item is not available right now"}), 409
 
-    price = menu_item.price
+    price_cents = menu_item.price_cents
 
-    new_order = Order(user_id=user_id, total=0)
+    new_order = Order(user_id=user_id, total_cents=0)
     db.session.add(new_order)
     db.session.flush() 
 
@@ -337,13 +769,15 @@ def create_order_item():
         order_id=new_order.id,
         menu_item_id=menu_item_id,
         quantity=quantity,
-        price=price
+        price_cents=price_cents
     )
     db.session.add(order_item)
 
-    new_order.total = quantity * price  
+    new_order.total_cents = quantity * price_cents
 
+    ListingVersion.bump(user_id, 'orders')
     db.session.commit()
+    publish_order_event(new_order)
 
     return jsonify(order_item.to_dict()), 201
 
@@ -352,6 +786,7 @@ def create_order_item():
 
 @app.route("/reservations", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def create_reservation():
     data = request.get_json()
     try:
@@ -368,12 +803,27 @@ def create_reservation():
         except ValueError:
             return jsonify({"error": "Invalid reservation_time format (use ISO 8601)"}), 422
 
+        if write_behind.enabled:
+            seq = write_behind.enqueue('reservation', int(user_id), {
+                "user_id": int(user_id),
+                "guest_size": int(guest_size),
+                "reservation_time": reservation_time.isoformat()
+            })
+            return jsonify({
+                "status": "queued",
+                "queue_id": seq,
+                "user_id": int(user_id),
+                "guest_size": int(guest_size),
+                "reservation_time": reservation_time.isoformat()
+            }), 202
+
         reservation = Reservation(
             user_id=int(user_id),
             guest_size=int(guest_size),
             reservation_time=reservation_time
         )
         db.session.add(reservation)
+        ListingVersion.bump(user_id, 'reservations')
         db.session.commit()
 
         return jsonify({
@@ -390,14 +840,19 @@ def create_reservation():
 @app.route("/reservations/user/<int:user_id>", methods=["GET"])
 @jwt_required()
 def get_reservations_by_user(user_id):
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
-    return jsonify([r.to_dict() for r in reservations]), 200
+    flush_pending_writes(user_id)
+
+    def build():
+        reservations = Reservation.query.filter_by(user_id=user_id).all()
+        return with_archived(ArchivedReservation, user_id, [r.to_dict() for r in reservations])
+    return cached_listing('reservations', user_id, build)
 
 
 
 
 @app.route("/reviews", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def create_review():
     data = request.get_json()
     try:
@@ -409,6 +864,33 @@ def create_review():
         if not (user_id and rating):
             return jsonify({"error": "Missing required fields"}), 400
 
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            return jsonify({"error": "rating must be an integer"}), 400
+
+        if menu_item_id is not None:
+            if not isinstance(menu_item_id, int) or isinstance(menu_item_id, bool):
+                return jsonify({"error": "menu_item_id must be an integer"}), 400
+            if not db.session.get(MenuItem, menu_item_id):
+                return jsonify({"error": "Menu item not found"}), 404
+
+        if write_behind.enabled:
+            seq = write_behind.enqueue('review', int(user_id), {
+                "user_id": int(user_id),
+                "menu_item_id": menu_item_id,
+                "rating": rating,
+                "comment": comment
+            })
+            return jsonify({
+                "status": "queued",
+                "queue_id": seq,
+                "user_id": int(user_id),
+                "menu_item_id": menu_item_id,
+                "rating": rating,
+                "comment": comment
+            }), 202
+
         review = Review(
             user_id=user_id,
             menu_item_id=menu_item_id,
@@ -416,7 +898,10 @@ def create_review():
             comment=comment,
         )
         db.session.add(review)
+        MenuItem.adjust_rating(menu_item_id, 1, rating)
+        ListingVersion.bump(user_id, 'reviews')
         db.session.commit()
+        menu_snapshot.invalidate()
 
         return jsonify({
             "id": review.id,
@@ -434,14 +919,19 @@ def create_review():
 @app.route("/reviews/user/<int:user_id>", methods=["GET"])
 @jwt_required()
 def get_reviews_by_user(user_id):
-    reviews = Review.query.filter_by(user_id=user_id).all()
-    return jsonify([r.to_dict() for r in reviews]), 200
+    flush_pending_writes(user_id)
+
+    def build():
+        reviews = Review.query.filter_by(user_id=user_id).all()
+        return with_archived(ArchivedReview, user_id, [r.to_dict() for r in reviews])
+    return cached_listing('reviews', user_id, build)
 
 
 
 
 @app.route('/orders', methods=['GET'])
 @jwt_required()
+@permission_required('orders:read_all')
 def get_all_orders():
     orders = Order.query.all()
     return jsonify([order.to_dict() for order in orders]), 200
@@ -460,15 +950,145 @@ def get_all_reviews():
 
 
 
+@app.route('/changes', methods=['GET'])
+@jwt_required()
+def get_changes():
+    names = request.args.get('tables', ','.join(changes.TRACKED)).split(',')
+    unknown = [name for name in names if name not in changes.TRACKED]
+    if unknown:
+        return jsonify({"error": f"Unknown tables: {', '.join(unknown)}"}), 400
+
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', 500)), 1000)
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+
+    result, next_token, has_more = changes.changes_since(since, names, limit)
+    if 'menu_items' in result:
+        upserts = result['menu_items']['upserts']
+        result['menu_items']['upserts'] = list(with_current_availability(upserts))
+    return jsonify({"changes": result, "next_token": next_token, "has_more": has_more}), 200
+
+
+@app.route('/search', methods=['GET'])
+@jwt_required()
+def search_catalogue():
+    kind = request.args.get('type', 'menu_items')
+    if kind not in search.INDEXES:
+        return jsonify({"error": f"type must be one of {', '.join(search.INDEXES)}"}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    results = search.search(kind, request.args.get('q', ''), limit=limit)
+    rows = [dict(row.to_dict(), rank=rank) for row, rank in results]
+    if kind == 'menu_items':
+        rows = list(with_current_availability(rows))
+    return jsonify(rows), 200
+
+
+
+@app.route('/export/<string:table>', methods=['GET'])
+@jwt_required()
+@permission_required('exports:read')
+def export_table(table):
+    export = EXPORTS.get(table)
+    if export is None:
+        return jsonify({"error": f"Unknown export '{table}'"}), 404
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt == 'ndjson':
+        body = stream_ndjson(export['ndjson']())
+        mimetype = 'application/x-ndjson'
+    elif fmt == 'csv':
+        body = stream_csv(export['csv'](), export['fields'])
+        mimetype = 'text/csv'
+    else:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+    )
+
+
+
+@app.route('/reports', methods=['POST'])
+@jwt_required()
+@permission_required('reports:read')
+def create_report():
+    data = request.get_json() or {}
+    kind = data.get('kind')
+    month = data.get('month')
+    if kind not in REPORTS:
+        return jsonify({"error": f"kind must be one of {', '.join(REPORTS)}"}), 400
+    try:
+        month_range(month)
+    except (TypeError, ValueError):
+        return jsonify({"error": "month must be given as YYYY-MM"}), 400
+
+    job = ReportJob(kind=kind, params=json.dumps({"month": month}), requested_by=int(get_jwt_identity()))
+    db.session.add(job)
+    db.session.commit()
+    return jsonify(job.to_dict()), 202
+
+
+@app.route('/reports/<int:id>', methods=['GET'])
+@jwt_required()
+@permission_required('reports:read')
+def get_report(id):
+    job = ReportJob.query.get_or_404(id)
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/reports/<int:id>/download', methods=['GET'])
+@jwt_required()
+@permission_required('reports:read')
+def download_report(id):
+    job = ReportJob.query.get_or_404(id)
+    if job.status != 'done':
+        return jsonify({"error": f"Report is {job.status}"}), 409
+    return send_file(job.file_path, mimetype='text/csv', as_attachment=True,
+                     download_name=os.path.basename(job.file_path))
+
+
+
 @app.route("/users", methods=["GET"])
 @jwt_required()
+@permission_required('users:read')
 def get_all_users():
     users = User.query.all()
     return jsonify([u.to_dict() for u in users]), 200
 
 
+@app.route('/users/<int:id>/role', methods=['PATCH'])
+@jwt_required()
+@permission_required('users:manage')
+def update_user_role(id):
+    user = User.query.get_or_404(id)
+    role = (request.get_json() or {}).get('role')
+    if role not in ROLE_PERMISSIONS:
+        return jsonify({"error": f"role must be one of {', '.join(ROLE_PERMISSIONS)}"}), 400
+
+    if role != user.role:
+        # Bumping the version revokes every token issued under the old role:
+        # at once in this worker, and in the others once their cached
+        # version expires (PERMISSION_CACHE_TTL seconds at most).
+        user.role = role
+        user.role_version += 1
+        db.session.commit()
+        permission_cache.set_version(user.id, user.role_version)
+
+    return jsonify(user.to_dict()), 200
+
+
 @app.route('/users/<int:id>', methods=['DELETE'])
 @jwt_required()
+@permission_required('users:delete')
 def delete_user(id):
     user = User.query.get(id)
     if not user:
@@ -476,10 +1096,20 @@ def delete_user(id):
 
     try:
         
-        Review.query.filter_by(user_id=user.id).delete()
+        for model in (Review, ArchivedReview):
+            rated = (
+                db.session.query(model.menu_item_id, db.func.count(model.id), db.func.sum(model.rating))
+                .filter(model.user_id == user.id, model.menu_item_id.isnot(None))
+                .group_by(model.menu_item_id)
+                .all()
+            )
+            for menu_item_id, count, total in rated:
+                MenuItem.adjust_rating(menu_item_id, -count, -total)
+            model.query.filter_by(user_id=user.id).delete()
 
         
         Reservation.query.filter_by(user_id=user.id).delete()
+        ArchivedReservation.query.filter_by(user_id=user.id).delete()
 
        
         orders = Order.query.filter_by(user_id=user.id).all()
@@ -487,9 +1117,16 @@ def delete_user(id):
             OrderItem.query.filter_by(order_id=order.id).delete()
         Order.query.filter_by(user_id=user.id).delete()
 
+        archived_orders = db.session.query(ArchivedOrder.archive_id).filter_by(user_id=user.id)
+        ArchivedOrderItem.query.filter(ArchivedOrderItem.order_archive_id.in_(archived_orders)).delete(synchronize_session=False)
+        ArchivedOrder.query.filter_by(user_id=user.id).delete()
+
        
         db.session.delete(user)
+        ListingVersion.bump(id)
         db.session.commit()
+        permission_cache.invalidate(id)
+        menu_snapshot.invalidate()
 
         return jsonify({"message": f"User '{user.name}' deleted successfully"}), 200
 
@@ -508,6 +1145,7 @@ def get_schedules():
 
 @app.route("/schedules", methods=["POST"])
 @jwt_required()
+@permission_required('schedules:write')
 def create_schedule():
     data = request.get_json()
     try:
@@ -536,6 +1174,7 @@ def create_schedule():
 
 @app.route("/schedules/<int:id>", methods=["PATCH"])
 @jwt_required()
+@permission_required('schedules:write')
 def update_schedule(id):
     schedule = Schedule.query.get_or_404(id)
     data = request.get_json()
@@ -567,6 +1206,7 @@ def update_schedule(id):
 
 @app.route("/schedules/<int:id>", methods=["DELETE"])
 @jwt_required()
+@permission_required('schedules:write')
 def delete_schedule(id):
     schedule = Schedule.query.get_or_404(id)
 
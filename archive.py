@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from models import (
+    db, Order, OrderItem, Reservation, Review,
+    ArchivedOrder, ArchivedOrderItem, ArchivedReservation, ArchivedReview,
+)
+
+
+# Each pass copies one batch of old rows into the archive tables and deletes
+# them from the live tables in the same transaction, so a row is always in
+# exactly one place and the writer lock is only held briefly.
+def _copy(model, archive, ids, **extra):
+    columns = [c.name for c in model.__table__.columns if c.name in archive.__table__.columns]
+    db.session.execute(
+        db.insert(archive).from_select(
+            columns + list(extra),
+            db.select(*[model.__table__.c[name] for name in columns], *extra.values()).where(model.id.in_(ids))
+        )
+    )
+
+
+def _move(model, archive, ids):
+    _copy(model, archive, ids)
+    db.session.execute(db.delete(model).where(model.id.in_(ids)))
+
+
+def archive_orders(cutoff, batch_size):
+    moved = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(Order.id).where(Order.created_at < cutoff).order_by(Order.id).limit(batch_size)
+        ).all()
+        if not ids:
+            return moved
+        item_ids = db.session.scalars(db.select(OrderItem.id).where(OrderItem.order_id.in_(ids))).all()
+        # Parents are copied first and deleted last so foreign keys hold on
+        # both sides throughout. Items find their archived parent through
+        # the newest archive row for their order id.
+        _copy(Order, ArchivedOrder, ids)
+        if item_ids:
+            parent = (
+                db.select(db.func.max(ArchivedOrder.archive_id))
+                .where(ArchivedOrder.id == OrderItem.order_id)
+                .scalar_subquery()
+            )
+            _copy(OrderItem, ArchivedOrderItem, item_ids, order_archive_id=parent)
+            db.session.execute(db.delete(OrderItem).where(OrderItem.id.in_(item_ids)))
+        db.session.execute(db.delete(Order).where(Order.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+
+def archive_table(model, archive, column, cutoff, batch_size):
+    moved = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(model.id).where(column < cutoff).order_by(model.id).limit(batch_size)
+        ).all()
+        if not ids:
+            return moved
+        _move(model, archive, ids)
+        db.session.commit()
+        moved += len(ids)
+
+
+def run_archive(days, batch_size=1000):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    try:
+        return {
+            'orders': archive_orders(cutoff, batch_size),
+            'reviews': archive_table(Review, ArchivedReview, Review.created_at, cutoff, batch_size),
+            # Reservations age out by when they were for, not when they were
+            # made, so upcoming bookings always stay live.
+            'reservations': archive_table(
+                Reservation, ArchivedReservation, Reservation.reservation_time, cutoff, batch_size
+            ),
+        }
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import decode_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from app import app, db, order_events
+from authz import permission_cache
+from models import Schedule
+
+
+# ASGI entry point: `uvicorn asgi:application` or the "asgi" profile in
+# gunicorn.conf.py. Hot read endpoints are served natively on an async
+# engine, so a slow client only costs a coroutine. Everything else falls
+# through to the Flask app, which runs on a thread pool.
+#
+# The native routes bypass the Flask request hooks: ReplicaRouter does not
+# route them (the async engine always points at the primary, so there is no
+# staleness to manage) and TrafficRecorder does not capture them. Replays of
+# recorded traffic therefore never include /schedules or the order streams.
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+flask_app = WSGIMiddleware(app, workers=int(app.config.get('ASGI_WSGI_THREADS', 32)))
+
+with app.app_context():
+    url = db.engine.url
+engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def authenticate(scope, query_string=False):
+    # Returns (claims, error). Accepts access tokens only, from a Bearer
+    # header or, for the SSE streams, ?jwt=. Decoding is pure CPU work, so
+    # it runs inline without touching the database.
+    headers = dict(scope['headers'])
+    auth = headers.get(b'authorization', b'').decode()
+    token = auth[7:] if auth.startswith('Bearer ') else None
+    if token is None and query_string:
+        token = parse_qs(scope.get('query_string', b'').decode()).get('jwt', [None])[0]
+    if token is None:
+        return None, 'Missing Authorization Header'
+
+    with app.app_context():
+        try:
+            claims = decode_token(token)
+        except Exception as e:
+            return None, str(e)
+    if claims.get('type') != 'access':
+        return None, 'Only non-refresh tokens are allowed'
+    return claims, None
+
+
+def check_permission(claims, permission):
+    # Same checks as @permission_required(); the role version lookup may hit
+    # the database, so callers run this off the event loop.
+    if permission not in claims.get('perms', ()):
+        return 403, {"error": "Forbidden", "required_permission": permission}
+    with app.app_context():
+        if claims.get('pv') != permission_cache.current_version(int(claims['sub'])):
+            return 401, {"error": "Token permissions are out of date, please log in again"}
+    return None
+
+
+async def get_schedules():
+    async with Session() as session:
+        schedules = await session.scalars(select(Schedule).options(selectinload(Schedule.staff_member)))
+        return [s.to_dict() for s in schedules]
+
+
+# /menu is left to Flask: it is served from the in-memory availability
+# snapshot, which already answers without touching the database.
+ASYNC_ROUTES = {
+    '/schedules': get_schedules,
+}
+
+
+# Order event streams, served here so an open EventSource costs a
+# coroutine instead of one of the WSGI threads (or, under the sync profile,
+# a whole worker that the gunicorn timeout then kills).
+STREAM_ROUTES = [
+    (re.compile(r'/orders/stream'), 'orders:read_all', lambda m: 'orders'),
+    (re.compile(r'/orders/user/(\d+)/stream'), None, lambda m: f'orders.user.{int(m[1])}'),
+]
+
+
+async def send_event_stream(receive, send, channel):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+
+    async def pump():
+        async for chunk in order_events.astream(channel):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Cancelling pump() unsubscribes the stream from the broker.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def serve_stream(scope, receive, send, match, permission, channel):
+    claims, error = authenticate(scope, query_string=True)
+    if error:
+        return await send_json(send, 401, {'msg': error})
+    if permission is not None:
+        denied = await asyncio.to_thread(check_permission, claims, permission)
+        if denied:
+            return await send_json(send, *denied)
+    await send_event_stream(receive, send, channel(match))
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope.get('method') == 'GET':
+        for pattern, permission, channel in STREAM_ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                return await serve_stream(scope, receive, send, match, permission, channel)
+
+    handler = ASYNC_ROUTES.get(scope.get('path'))
+    if handler is None or scope.get('method') != 'GET':
+        return await flask_app(scope, receive, send)
+
+    _, error = authenticate(scope)
+    if error:
+        return await send_json(send, 401, {'msg': error})
+    await send_json(send, 200, await handler())
@@ -0,0 +1,100 @@
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+from flask_jwt_extended import create_access_token, get_jwt
+
+from models import db, User
+
+
+ROLE_PERMISSIONS = {
+    'admin': {
+        'users:read', 'users:delete', 'users:manage',
+        'orders:read_all', 'orders:update_status',
+        'menu:write', 'schedules:write', 'exports:read', 'reports:read', 'metrics:read',
+    },
+    'staff': {
+        'orders:read_all', 'orders:update_status', 'schedules:write',
+    },
+    'customer': set(),
+}
+
+
+def claims_for(user):
+    return {
+        'role': user.role,
+        'perms': sorted(ROLE_PERMISSIONS.get(user.role, ())),
+        'pv': user.role_version,
+    }
+
+
+def issue_access_token(user, **kwargs):
+    return create_access_token(identity=str(user.id), additional_claims=claims_for(user), **kwargs)
+
+
+# Maps user id -> current role_version. A token is honoured only while its
+# "pv" claim matches, so changing a role revokes outstanding tokens. Entries
+# are refreshed from the database at most once per PERMISSION_CACHE_TTL
+# seconds per process; role changes made through this process update the
+# entry immediately, while other workers keep honouring old tokens until
+# their entry expires. The TTL is therefore the revocation window.
+class PermissionCache:
+
+    def __init__(self, app=None, ttl=5):
+        self.ttl = ttl
+        self.versions = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PERMISSION_CACHE_TTL', self.ttl)
+        self.ttl = app.config['PERMISSION_CACHE_TTL']
+        app.extensions['permission_cache'] = self
+
+    def current_version(self, user_id):
+        now = time.monotonic()
+        entry = self.versions.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        # Always read from the primary: a replica that lags (or, with the
+        # local file stand-in, is never synced) would keep revoked tokens
+        # working on GET requests.
+        version = db.session.execute(
+            db.select(User.role_version).where(User.id == user_id),
+            bind_arguments={'bind': db.engine},
+        ).scalar()
+        with self.lock:
+            self.versions[user_id] = (version, now + self.ttl)
+        return version
+
+    def set_version(self, user_id, version):
+        with self.lock:
+            self.versions[user_id] = (version, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.versions.pop(user_id, None)
+
+
+permission_cache = PermissionCache()
+
+
+def permission_required(permission):
+    # Use below @jwt_required(). The check only reads claims already decoded
+    # from the token, plus the cached role version.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            claims = get_jwt()
+            if permission not in claims.get('perms', ()):
+                return jsonify({"error": "Forbidden", "required_permission": permission}), 403
+
+            user_id = int(claims['sub'])
+            if claims.get('pv') != permission_cache.current_version(user_id):
+                return jsonify({"error": "Token permissions are out of date, please log in again"}), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,178 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.orm import selectinload
+
+from models import db, Menu, AvailabilityWindow, CatalogueVersion
+
+
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def window_intervals(window):
+    # (start, length) pairs in seconds from Monday 00:00, one per weekday.
+    start = _seconds(window.start_time)
+    length = (_seconds(window.end_time) - start) % DAY or DAY
+    return [(int(day) * DAY + start, length) for day in sorted(set(window.days))]
+
+
+def is_open(intervals, moment):
+    return any((moment - start) % WEEK < length for start, length in intervals)
+
+
+# Menus, items and windows as loaded from the database, plus the sorted list
+# of weekly boundaries at which any window opens or closes. Availability can
+# only change at one of those points, so between two of them a single
+# rendered view is valid.
+class Catalogue:
+
+    def __init__(self):
+        self.version = db.session.scalar(db.select(CatalogueVersion.version).where(CatalogueVersion.id == 1)) or 0
+        self.loaded_at = time.monotonic()
+
+        menus = db.session.scalars(db.select(Menu).options(selectinload(Menu.items)).order_by(Menu.id)).all()
+        self.menus = []
+        for menu in menus:
+            fields = menu.to_dict()
+            del fields['items']
+            items = sorted(menu.items, key=lambda item: item.id)
+            self.menus.append((fields, [item.to_dict() for item in items]))
+
+        self.windows = {}
+        for window in db.session.scalars(db.select(AvailabilityWindow)):
+            key = ('menu', window.menu_id) if window.menu_id is not None else ('item', window.menu_item_id)
+            self.windows.setdefault(key, []).extend(window_intervals(window))
+
+        self.boundaries = sorted({
+            point % WEEK
+            for intervals in self.windows.values()
+            for start, length in intervals
+            for point in (start, start + length)
+        })
+
+    def next_boundary(self, moment):
+        if not self.boundaries:
+            return None
+        i = bisect.bisect_right(self.boundaries, moment)
+        return self.boundaries[i] if i < len(self.boundaries) else self.boundaries[0] + WEEK
+
+    def render(self, moment, dumps):
+        active = {key for key, intervals in self.windows.items() if is_open(intervals, moment)}
+
+        def available(key, flag):
+            return bool(flag) and (key not in self.windows or key in active)
+
+        menus, items = [], []
+        for fields, menu_items in self.menus:
+            menu_open = available(('menu', fields['id']), fields['available'])
+            rendered = [
+                dict(item, available=menu_open and available(('item', item['id']), item['available']))
+                for item in menu_items
+            ]
+            menus.append(dict(fields, available=menu_open, items=rendered))
+            items.extend(rendered)
+        items.sort(key=lambda item: item['id'])
+
+        open_menus = [dict(menu, items=[i for i in menu['items'] if i['available']]) for menu in menus if menu['available']]
+        open_items = [item for item in items if item['available']]
+        return {
+            'menu': dumps(menus).encode(),
+            'menu_available': dumps(open_menus).encode(),
+            'menu_items': dumps(items).encode(),
+            'menu_items_available': dumps(open_items).encode(),
+            'available_item_ids': frozenset(item['id'] for item in open_items),
+        }
+
+
+class View:
+
+    def __init__(self, catalogue, payloads, valid_until):
+        self.catalogue = catalogue
+        self.payloads = payloads
+        self.valid_until = valid_until
+
+
+# Serves the menu from an in-memory view that is re-rendered only when the
+# current time crosses a window boundary, and reloaded from the database only
+# when the catalogue changes. Writes in this process invalidate it directly;
+# writes from other workers are picked up by checking CatalogueVersion at
+# most once per MENU_SNAPSHOT_CHECK_INTERVAL seconds. Rating aggregates are
+# not versioned: review writes invalidate the snapshot in the process that
+# applies them, and other workers pick the new ratings up within
+# MENU_SNAPSHOT_MAX_AGE seconds.
+class MenuSnapshot:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.catalogue = None
+        self.view = None
+        self.checked_until = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MENU_TIMEZONE', None)
+        app.config.setdefault('MENU_SNAPSHOT_CHECK_INTERVAL', 5)
+        app.config.setdefault('MENU_SNAPSHOT_MAX_AGE', 60)
+        self.app = app
+        zone = app.config['MENU_TIMEZONE']
+        self.zone = ZoneInfo(zone) if zone else None
+        app.extensions['menu_snapshot'] = self
+
+    def now(self):
+        return datetime.now(self.zone)
+
+    def _fresh(self, view, now):
+        return (
+            view is not None
+            and time.monotonic() < self.checked_until
+            and (view.valid_until is None or now < view.valid_until)
+        )
+
+    def current(self):
+        now = self.now()
+        view = self.view
+        if self._fresh(view, now):
+            return view
+
+        with self.lock:
+            view = self.view
+            if self._fresh(view, now):
+                return view
+
+            checked = time.monotonic()
+            catalogue = self.catalogue
+            if (
+                catalogue is None
+                or checked - catalogue.loaded_at > self.app.config['MENU_SNAPSHOT_MAX_AGE']
+                or db.session.scalar(
+                    db.select(CatalogueVersion.version).where(CatalogueVersion.id == 1)
+                ) not in (catalogue.version, None)
+            ):
+                catalogue = self.catalogue = Catalogue()
+            self.checked_until = checked + self.app.config['MENU_SNAPSHOT_CHECK_INTERVAL']
+
+            if view is None or view.catalogue is not catalogue or (
+                view.valid_until is not None and now >= view.valid_until
+            ):
+                moment = now.weekday() * DAY + _seconds(now)
+                boundary = catalogue.next_boundary(moment)
+                valid_until = None
+                if boundary is not None:
+                    valid_until = now.replace(microsecond=0) + timedelta(seconds=boundary - moment)
+                view = self.view = View(catalogue, catalogue.render(moment, self.app.json.dumps), valid_until)
+            return view
+
+    def invalidate(self):
+        with self.lock:
+            self.catalogue = None
+            self.view = None
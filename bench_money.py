@@ -0,0 +1,125 @@
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+
+# Compares aggregate queries over float prices (the old schema) and integer
+# cents (the current one) on a throwaway SQLite database, e.g.:
+#
+#   python bench_money.py --orders 200000 --repeat 5
+#
+# Both layouts hold the same generated orders, so the sums should agree to
+# the cent; the float side also reports how far its raw sum drifted.
+
+
+SCHEMAS = {
+    'float': (
+        'CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, total FLOAT NOT NULL);'
+        'CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, '
+        'menu_item_id INTEGER NOT NULL, quantity INTEGER NOT NULL, price FLOAT NOT NULL);'
+        'CREATE INDEX ix_order_items_order_id ON order_items (order_id);'
+    ),
+    'cents': (
+        'CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, total_cents INTEGER NOT NULL);'
+        'CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, '
+        'menu_item_id INTEGER NOT NULL, quantity INTEGER NOT NULL, price_cents INTEGER NOT NULL);'
+        'CREATE INDEX ix_order_items_order_id ON order_items (order_id);'
+    ),
+}
+
+QUERIES = {
+    'float': {
+        'revenue': 'SELECT SUM(quantity * price) FROM order_items',
+        'revenue_by_item': 'SELECT menu_item_id, SUM(quantity), SUM(quantity * price) '
+                           'FROM order_items GROUP BY menu_item_id',
+        'totals_by_user': 'SELECT user_id, SUM(total) FROM orders GROUP BY user_id',
+    },
+    'cents': {
+        'revenue': 'SELECT SUM(quantity * price_cents) FROM order_items',
+        'revenue_by_item': 'SELECT menu_item_id, SUM(quantity), SUM(quantity * price_cents) '
+                           'FROM order_items GROUP BY menu_item_id',
+        'totals_by_user': 'SELECT user_id, SUM(total_cents) FROM orders GROUP BY user_id',
+    },
+}
+
+
+def populate(conn, layout, orders, seed):
+    rng = random.Random(seed)
+    prices = [rng.randint(50, 250000) for _ in range(60)]
+    conn.executescript(SCHEMAS[layout])
+    order_rows, item_rows = [], []
+    item_id = 0
+    for order_id in range(1, orders + 1):
+        total = 0
+        for _ in range(rng.randint(1, 4)):
+            item_id += 1
+            menu_item_id = rng.randrange(len(prices))
+            quantity = rng.randint(1, 3)
+            price = prices[menu_item_id]
+            total += price * quantity
+            item_rows.append((item_id, order_id, menu_item_id, quantity, price / 100 if layout == 'float' else price))
+        order_rows.append((order_id, rng.randint(1, 5000), total / 100 if layout == 'float' else total))
+    conn.executemany('INSERT INTO orders VALUES (?, ?, ?)', order_rows)
+    conn.executemany('INSERT INTO order_items VALUES (?, ?, ?, ?, ?)', item_rows)
+    conn.commit()
+    return item_id
+
+
+def python_totals(conn):
+    # What Order.total_amount used to do for every order on every read.
+    totals = {}
+    for order_id, quantity, price in conn.execute('SELECT order_id, quantity, price FROM order_items'):
+        totals[order_id] = totals.get(order_id, 0) + quantity * price
+    return totals
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in ('float', 'cents'):
+            conn = sqlite3.connect(os.path.join(directory, f'{layout}.db'))
+            items = populate(conn, layout, args.orders, args.seed)
+            results[layout] = {}
+            for name, sql in QUERIES[layout].items():
+                results[layout][name] = timed(lambda: conn.execute(sql).fetchall(), args.repeat)
+            if layout == 'float':
+                results[layout]['python_order_totals'] = timed(lambda: python_totals(conn), args.repeat)
+            conn.close()
+
+    print(f'{args.orders} orders, {items} order items, median of {args.repeat} runs')
+    print(f"{'query':<22}{'float ms':>12}{'cents ms':>12}")
+    for name in list(QUERIES['cents']) + ['python_order_totals']:
+        float_ms = results['float'][name][0] * 1000
+        cents = results['cents'].get(name)
+        cents_ms = f'{cents[0] * 1000:12.1f}' if cents else f"{'-':>12}"
+        print(f'{name:<22}{float_ms:12.1f}{cents_ms}')
+
+    float_revenue = results['float']['revenue'][1][0][0]
+    cents_revenue = results['cents']['revenue'][1][0][0]
+    print(f'revenue as float: {float_revenue!r}')
+    print(f'revenue in cents: {cents_revenue} (exact)')
+    print(f'float drift: {abs(float_revenue * 100 - cents_revenue):.6f} cents')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from flask_jwt_extended import create_access_token
+
+from app import app
+
+
+# Compares the sync and asgi gunicorn profiles under many concurrent
+# keep-alive connections, e.g.:
+#
+#   python bench_workers.py --concurrency 1000 --duration 30 --path /schedules
+#
+# Each profile is started in turn on its own port against the local
+# database, hammered for the given duration and shut down. /schedules is
+# the route the asgi profile serves on its async engine; other paths (e.g.
+# /menu) go through Flask in both profiles and only compare the workers.
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+
+            status = await reader.readline()
+            if not status:
+                raise ConnectionError('connection closed')
+            length, close = 0, False
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'connection' and value.strip().lower() == 'close':
+                    close = True
+            await reader.readexactly(length)
+
+            latencies.append(time.monotonic() - started)
+            if not status.split()[1].startswith(b'2'):
+                errors.append(status.decode().strip())
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ConnectionError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, path, token, concurrency, duration):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+        f'Authorization: Bearer {token}\r\nConnection: keep-alive\r\n\r\n'
+    ).encode()
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[
+        client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)
+    ])
+    return latencies, errors
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def report(profile, latencies, errors, duration):
+    if not latencies:
+        print(f'{profile:<6} no successful requests, {len(errors)} errors')
+        return
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(
+        f'{profile:<6} {len(latencies) / duration:>9.1f} req/s  '
+        f'p50 {pct(0.50):>8.1f} ms  p95 {pct(0.95):>8.1f} ms  p99 {pct(0.99):>8.1f} ms  '
+        f'mean {statistics.mean(latencies) * 1000:>8.1f} ms  errors {len(errors)}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default='sync,asgi')
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--path', default='/schedules')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        token = create_access_token(identity='1')
+
+    for offset, profile in enumerate(args.profiles.split(',')):
+        port = args.port + offset
+        env = dict(os.environ, FUD_WORKER_PROFILE=profile, PORT=str(port), WEB_CONCURRENCY=str(args.workers))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_port('127.0.0.1', port)
+            latencies, errors = asyncio.run(
+                run_load('127.0.0.1', port, args.path, token, args.concurrency, args.duration)
+            )
+            report(profile, latencies, errors, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from models import db, ChangeLog, MenuItem, Reservation, Schedule
+
+
+# Triggers on each tracked table keep exactly one change_log entry per row:
+# every insert, update or delete replaces the row's previous entry with a
+# new one at the next sequence number, and deletes leave a tombstone. A
+# client holding sequence N therefore only needs entries with seq > N, and
+# the log never grows beyond one entry per row ever seen.
+#
+# That only holds if entries become visible in seq order. SQLite has a single
+# writer, so they do. On Postgres two transactions can draw seqs N and N+1
+# and commit in the opposite order; a client that read N+1 first would never
+# see N. The Postgres trigger therefore takes a transaction-scoped advisory
+# lock before drawing a seq, which serialises change-log writers from that
+# point until commit.
+TRACKED = {
+    'menu_items': {'model': MenuItem, 'table': 'menu_items', 'options': []},
+    'schedules': {'model': Schedule, 'table': 'staff_schedules', 'options': [joinedload(Schedule.staff_member)]},
+    'reservations': {'model': Reservation, 'table': 'reservations', 'options': [joinedload(Reservation.user)]},
+}
+
+
+def sqlite_ddl(table):
+    def record(ref, op):
+        return (
+            f"DELETE FROM change_log WHERE table_name = '{table}' AND row_id = {ref}.id; "
+            f"INSERT INTO change_log (table_name, row_id, op, changed_at) "
+            f"VALUES ('{table}', {ref}.id, '{op}', CURRENT_TIMESTAMP); "
+        )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_ai AFTER INSERT ON {table} BEGIN {record('new', 'upsert')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_au AFTER UPDATE ON {table} BEGIN {record('new', 'upsert')}END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_ad AFTER DELETE ON {table} BEGIN {record('old', 'delete')}END",
+    ]
+
+
+POSTGRES_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+DECLARE
+    changed_id integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.id;
+    ELSE
+        changed_id := NEW.id;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('change_log'));
+    DELETE FROM change_log WHERE table_name = TG_TABLE_NAME AND row_id = changed_id;
+    INSERT INTO change_log (table_name, row_id, op, changed_at)
+    VALUES (TG_TABLE_NAME, changed_id, CASE WHEN TG_OP = 'DELETE' THEN 'delete' ELSE 'upsert' END, now());
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def postgres_ddl(table):
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_changes ON {table}",
+        f"CREATE TRIGGER {table}_changes AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION record_change()",
+    ]
+
+
+def create_triggers(connection):
+    postgres = connection.dialect.name == 'postgresql'
+    if postgres:
+        connection.execute(text(POSTGRES_FUNCTION))
+    for tracked in TRACKED.values():
+        ddl = postgres_ddl if postgres else sqlite_ddl
+        for statement in ddl(tracked['table']):
+            connection.execute(text(statement))
+
+
+def changes_since(since, names, limit):
+    tables = {TRACKED[name]['table']: name for name in names}
+    entries = db.session.scalars(
+        db.select(ChangeLog)
+        .where(ChangeLog.seq > since, ChangeLog.table_name.in_(tables))
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    result = {name: {'upserts': [], 'deletes': []} for name in names}
+    upserts = {}
+    for entry in entries:
+        name = tables[entry.table_name]
+        if entry.op == 'delete':
+            result[name]['deletes'].append(entry.row_id)
+        else:
+            upserts.setdefault(name, []).append(entry.row_id)
+
+    for name, ids in upserts.items():
+        tracked = TRACKED[name]
+        model = tracked['model']
+        rows = model.query.options(*tracked['options']).filter(model.id.in_(ids))
+        result[name]['upserts'] = [row.to_dict() for row in rows]
+
+    next_token = entries[-1].seq if entries else since
+    return result, next_token, has_more
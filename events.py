@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+# Subscribers (one per open SSE connection) register a queue with the broker
+# for the channels they care about. Publishing goes through a backend, which
+# is responsible for getting the event to the broker in every worker
+# process; the broker then fans it out to its local queues.
+class LocalBackend:
+    # Single-process delivery, fine for the dev server or one worker.
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, payload):
+        self.deliver(channel, payload)
+
+
+class SQLiteBackend:
+    # Cross-process delivery for several workers on one host: events are
+    # appended to a shared SQLite file and every process tails it.
+
+    def __init__(self, path, interval=0.25, retention=timedelta(minutes=5)):
+        self.path = path
+        self.interval = interval
+        self.retention = retention
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' channel TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' created_at TEXT NOT NULL)'
+        )
+        return conn
+
+    def start(self, deliver):
+        self.deliver = deliver
+        conn = self._connect()
+        try:
+            self.last_seq = conn.execute('SELECT coalesce(max(seq), 0) FROM events').fetchone()[0]
+        finally:
+            conn.close()
+        threading.Thread(target=self._tail, name='order-events', daemon=True).start()
+
+    def publish(self, channel, payload):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO events (channel, payload, created_at) VALUES (?, ?, ?)',
+                (channel, json.dumps(payload), datetime.utcnow().isoformat())
+            )
+        finally:
+            conn.close()
+
+    def _tail(self):
+        conn = self._connect()
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            try:
+                rows = conn.execute(
+                    'SELECT seq, channel, payload FROM events WHERE seq > ? ORDER BY seq',
+                    (self.last_seq,)
+                ).fetchall()
+                for seq, channel, payload in rows:
+                    self.last_seq = seq
+                    self.deliver(channel, json.loads(payload))
+
+                if time.monotonic() - last_prune > self.retention.total_seconds():
+                    cutoff = (datetime.utcnow() - self.retention).isoformat()
+                    conn.execute('DELETE FROM events WHERE created_at < ?', (cutoff,))
+                    last_prune = time.monotonic()
+            except sqlite3.Error:
+                conn.close()
+                conn = self._connect()
+
+
+class AsyncSubscriber:
+    # Queue for a coroutine (asgi.py's SSE streams). Deliveries arrive on
+    # whichever thread published or tails the backend, so they are handed
+    # to the subscriber's event loop.
+
+    def __init__(self, loop, maxsize=1000):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, payload):
+        self.loop.call_soon_threadsafe(self._put, payload)
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+
+def format_event(payload):
+    return f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+
+class EventBroker:
+
+    def __init__(self, app=None):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ORDER_EVENTS_BACKEND', 'local')
+        app.config.setdefault('ORDER_EVENTS_PATH', os.path.join(app.instance_path, 'order_events.db'))
+        app.config.setdefault('ORDER_EVENTS_HEARTBEAT', 15)
+        self.app = app
+        app.extensions['order_events'] = self
+
+    def _ensure_started(self):
+        if self.backend is not None:
+            return
+        with self.lock:
+            if self.backend is not None:
+                return
+            if self.app.config['ORDER_EVENTS_BACKEND'] == 'sqlite':
+                backend = SQLiteBackend(self.app.config['ORDER_EVENTS_PATH'])
+            else:
+                backend = LocalBackend()
+            backend.start(self._deliver)
+            self.backend = backend
+
+    def publish(self, channel, payload):
+        self._ensure_started()
+        self.backend.publish(channel, payload)
+
+    def subscribe(self, *channels, subscriber=None):
+        self._ensure_started()
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=1000)
+        with self.lock:
+            for channel in channels:
+                self.subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            for channel in list(self.subscribers):
+                self.subscribers[channel].discard(subscriber)
+                if not self.subscribers[channel]:
+                    del self.subscribers[channel]
+
+    def _deliver(self, channel, payload):
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+        for subscriber in targets:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # A client that stopped reading shouldn't hold up the rest.
+                pass
+
+    def stream(self, *channels):
+        # Generator for a text/event-stream response. Sends a comment line
+        # as a heartbeat so proxies keep the connection open.
+        subscriber = self.subscribe(*channels)
+        heartbeat = self.app.config['ORDER_EVENTS_HEARTBEAT']
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    payload = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(payload)
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def astream(self, *channels):
+        # Same stream for the ASGI entry point: an open connection is a
+        # waiting coroutine rather than a blocked thread.
+        subscriber = self.subscribe(*channels, subscriber=AsyncSubscriber(asyncio.get_running_loop()))
+        heartbeat = self.app.config['ORDER_EVENTS_HEARTBEAT']
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(payload)
+        finally:
+            self.unsubscribe(subscriber)
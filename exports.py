@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import Order, Reservation, Review
+
+
+# Rows are pulled from the database in fixed-size batches with yield_per and
+# written out one at a time, so memory stays flat however large the table is
+# and the first bytes go out as soon as the first batch arrives.
+BATCH_SIZE = 500
+
+
+def order_rows():
+    query = (
+        Order.query
+        .options(joinedload(Order.user), selectinload(Order.items))
+        .order_by(Order.id)
+        .yield_per(BATCH_SIZE)
+    )
+    for order in query:
+        yield order.to_dict()
+
+
+def order_item_rows():
+    # CSV can't nest, so orders are flattened to one line per item.
+    for order in order_rows():
+        for item in order['items']:
+            yield {
+                'order_id': order['id'],
+                'user_id': order['user_id'],
+                'user_name': order['user_name'],
+                'created_at': order['created_at'],
+                'menu_item_id': item['menu_item_id'],
+                'quantity': item['quantity'],
+                'price': item['price'],
+            }
+
+
+def review_rows():
+    query = Review.query.options(joinedload(Review.user)).order_by(Review.id).yield_per(BATCH_SIZE)
+    for review in query:
+        yield review.to_dict()
+
+
+def reservation_rows():
+    query = Reservation.query.options(joinedload(Reservation.user)).order_by(Reservation.id).yield_per(BATCH_SIZE)
+    for reservation in query:
+        yield reservation.to_dict()
+
+
+EXPORTS = {
+    'orders': {
+        'ndjson': order_rows,
+        'csv': order_item_rows,
+        'fields': ['order_id', 'user_id', 'user_name', 'created_at', 'menu_item_id', 'quantity', 'price'],
+    },
+    'reviews': {
+        'ndjson': review_rows,
+        'csv': review_rows,
+        'fields': ['id', 'user_id', 'user_name', 'menu_item_id', 'rating', 'comment', 'created_at', 'updated_at'],
+    },
+    'reservations': {
+        'ndjson': reservation_rows,
+        'csv': reservation_rows,
+        'fields': ['id', 'user_id', 'user_name', 'reservation_time', 'guest_size', 'created_at'],
+    },
+}
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
+
+
+def stream_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(row)
+        yield buffer.getvalue()
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+
+# gunicorn -c gunicorn.conf.py
+#
+# FUD_WORKER_PROFILE=sync  Flask over WSGI with sync workers; every open
+#                          connection holds a worker process.
+# FUD_WORKER_PROFILE=asgi  asgi:application on uvicorn workers; /schedules
+#                          runs on the async engine, the rest of the app on
+#                          each worker's thread pool.
+#
+# The order event streams (/orders/stream, /orders/user/<id>/stream) need
+# the asgi profile, where they are served as coroutines. Under the sync
+# profile each stream pins a worker and is killed after `timeout` seconds.
+# With several workers, set ORDER_EVENTS_BACKEND=sqlite so events reach
+# streams held by other processes.
+profile = os.environ.get('FUD_WORKER_PROFILE', 'sync')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+backlog = 2048
+timeout = 60
+
+if profile == 'asgi':
+    wsgi_app = 'asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # Idle keep-alive connections are cheap coroutines here.
+    keepalive = 75
+else:
+    wsgi_app = 'app:app'
+    worker_class = 'sync'
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import time
+from functools import wraps
+
+from flask import request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+
+
+# Responses to POSTs carrying an Idempotency-Key header are kept in a small
+# SQLite file next to the main database. The first request for a key claims
+# it with an INSERT; retries and concurrent duplicates then either replay the
+# stored response or wait for the claim holder to finish, so the handler runs
+# once and the main database never sees the retry.
+class IdempotencyStore:
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDEMPOTENCY_PATH', os.path.join(app.instance_path, 'idempotency.db'))
+        app.config.setdefault('IDEMPOTENCY_TTL', 24 * 60 * 60)
+        app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', 30)
+        app.config.setdefault('IDEMPOTENCY_WAIT', 10)
+        self.app = app
+        self.path = app.config['IDEMPOTENCY_PATH']
+        app.extensions['idempotency'] = self
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS idempotency_keys ('
+            ' digest BLOB PRIMARY KEY,'
+            ' fingerprint BLOB NOT NULL,'
+            ' status INTEGER,'
+            ' body BLOB,'
+            ' claimed_at REAL NOT NULL,'
+            ' expires_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        return conn
+
+    def claim(self, digest, fingerprint):
+        # Returns (True, None) if this request now owns the key, otherwise
+        # (False, row) with the existing (fingerprint, status, body, claimed_at).
+        now = time.time()
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                'INSERT OR IGNORE INTO idempotency_keys (digest, fingerprint, claimed_at, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (digest, fingerprint, now, now + self.app.config['IDEMPOTENCY_TTL'])
+            )
+            if cur.rowcount:
+                return True, None
+
+            row = conn.execute(
+                'SELECT fingerprint, status, body, claimed_at, expires_at FROM idempotency_keys WHERE digest = ?',
+                (digest,)
+            ).fetchone()
+            if row is None:
+                return self.claim(digest, fingerprint)
+
+            stale = row[1] is None and row[3] < now - self.app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+            if row[4] < now or stale:
+                # Expired, or the previous holder died mid-request. The
+                # claimed_at check makes the takeover atomic.
+                cur = conn.execute(
+                    'UPDATE idempotency_keys SET fingerprint = ?, status = NULL, body = NULL, '
+                    'claimed_at = ?, expires_at = ? WHERE digest = ? AND claimed_at = ?',
+                    (fingerprint, now, now + self.app.config['IDEMPOTENCY_TTL'], digest, row[3])
+                )
+                if cur.rowcount:
+                    return True, None
+            return False, row[:4]
+        finally:
+            conn.close()
+
+    def complete(self, digest, status, body):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE idempotency_keys SET status = ?, body = ? WHERE digest = ?',
+                (status, body, digest)
+            )
+            if int.from_bytes(digest[:1], 'big') == 0:
+                # Roughly one write in 256 also sweeps expired keys.
+                conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (time.time(),))
+        finally:
+            conn.close()
+
+    def release(self, digest):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM idempotency_keys WHERE digest = ? AND status IS NULL', (digest,))
+        finally:
+            conn.close()
+
+    def wait(self, digest, fingerprint):
+        deadline = time.monotonic() + self.app.config['IDEMPOTENCY_WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            owned, row = self.claim(digest, fingerprint)
+            if owned or row[1] is not None:
+                return owned, row
+        return False, None
+
+    def idempotent(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view(*args, **kwargs)
+
+            scope = f"{get_jwt_identity()}:{request.method}:{request.path}:{key}"
+            digest = hashlib.sha256(scope.encode()).digest()[:16]
+            fingerprint = hashlib.sha256(request.get_data()).digest()[:16]
+
+            owned, row = self.claim(digest, fingerprint)
+            if not owned and row[1] is None:
+                owned, row = self.wait(digest, fingerprint)
+                if row is None:
+                    return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+            if not owned:
+                if row[0] != fingerprint:
+                    return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+                response = make_response(row[2], row[1])
+                response.mimetype = 'application/json'
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                self.release(digest)
+                raise
+
+            # Server errors aren't cached so the client can retry them.
+            if response.status_code >= 500:
+                self.release(digest)
+            else:
+                self.complete(digest, response.status_code, response.get_data())
+            return response
+        return wrapper
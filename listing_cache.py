@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+from models import ListingVersion
+
+
+# Serialized per-user listings (/orders/user/<id> and friends), kept in an
+# LRU bounded by the total size of the cached bodies. Every entry remembers
+# the ListingVersion it was built under, and a hit is served only while
+# that version is still current. Writers bump the version in their own
+# transaction, so a write made by any worker or CLI process (including
+# `flask archive`) invalidates the copies held by every other worker. The
+# version is read from the database the request is routed to, the same one
+# the body is built from: a body built on a lagging replica carries that
+# replica's older version, so a caller pinned to the primary after writing
+# never gets it. A hit costs one primary-key lookup instead of the listing
+# queries and serialization.
+class ListingCache:
+
+    def __init__(self, app=None):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LISTING_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+        self.app = app
+        self.max_bytes = app.config['LISTING_CACHE_MAX_BYTES']
+        app.extensions['listing_cache'] = self
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def get_or_build(self, kind, user_id, archived, build):
+        # Returns (body, hit). build() returns the rows to serialize.
+        key = (kind, user_id, archived)
+        # Read before building: a write that commits while build() runs
+        # bumps the version past this one, so the entry is never served.
+        version = ListingVersion.current(user_id, kind)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1], True
+            self.stats['stale' if entry is not None else 'misses'] += 1
+
+        body = self.app.json.dumps(build()).encode()
+
+        if len(body) <= self.max_bytes // 4:
+            with self.lock:
+                self._remove(key)
+                self.entries[key] = (version, body)
+                self.size += len(body)
+                while self.size > self.max_bytes:
+                    _, (_, evicted) = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+                    self.stats['evictions'] += 1
+        return body, False
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['stale']
+            return dict(
+                self.stats,
+                entries=len(self.entries),
+                bytes=self.size,
+                max_bytes=self.max_bytes,
+                hit_ratio=round(self.stats['hits'] / lookups, 4) if lookups else None,
+            )
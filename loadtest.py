@@ -0,0 +1,525 @@
+import argparse
+import io
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert, make_url
+from werkzeug.security import generate_password_hash
+
+from app import app, DEFAULT_DATABASE_URI
+from authz import issue_access_token
+from models import db, User, Menu, MenuItem, Order, OrderItem, Reservation, Review, ORDER_STATUSES
+
+
+# Records, synthesizes and replays traffic scenarios against a local copy:
+#
+#   TRAFFIC_RECORD_PATH=traffic.ndjson TRAFFIC_RECORD_SALT=... gunicorn app:app   # record (see traffic.py)
+#   export DATABASE_URL=sqlite:///loadtest.db                # the local copy, never the app's own database
+#   flask db upgrade
+#   python loadtest.py seed --users 500 --orders 5000        # synthetic local data
+#   gunicorn app:app                                         # serve the local copy
+#   python loadtest.py synthesize --rps 20 --duration 60 --out scenario.ndjson
+#   python loadtest.py replay scenario.ndjson --url http://127.0.0.1:5000 --speeds 1,2,4,8
+#
+# Replay maps the pseudonymous ids in the log onto rows of the local
+# database (the same pseudonym always gets the same local row), sends each
+# request at its recorded offset divided by the speed-up, and reports
+# per-route latency at every speed.
+
+PASSWORD = 'loadtest'
+PICTURE = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+
+DEFAULT_MIX = 'menu=70,orders=15,bookings=10,admin=5'
+MIX_ROUTES = {
+    'menu': [
+        ('GET', '/menu', 6), ('GET', '/menu_items', 2), ('GET', '/menu_items/<int:id>', 1), ('GET', '/search', 1),
+    ],
+    'orders': [
+        ('POST', '/order_items', 5), ('GET', '/orders/user/<int:user_id>', 3),
+        ('GET', '/orders/user/<int:user_id>/recent', 1), ('POST', '/orders/<int:id>/reorder', 1),
+    ],
+    'bookings': [
+        ('POST', '/reservations', 3), ('GET', '/reservations/user/<int:user_id>', 3),
+        ('POST', '/reviews', 2), ('GET', '/reviews/user/<int:user_id>', 2),
+    ],
+    'admin': [
+        ('GET', '/orders', 3), ('GET', '/users', 2), ('GET', '/reservations', 1), ('GET', '/reviews', 1),
+    ],
+}
+
+
+class LocalData:
+    # Local rows that recorded pseudonyms are mapped onto, plus a token for
+    # every user a replay may act as.
+
+    def __init__(self, max_users=500):
+        with app.app_context():
+            users = db.session.query(User.id, User.role).order_by(User.id).all()
+            customers = [user_id for user_id, role in users if role == 'customer'][:max_users]
+            admin = next((user_id for user_id, role in users if role == 'admin'), None)
+            if not customers or admin is None:
+                raise SystemExit('The local database needs customers and an admin; run `loadtest.py seed` first.')
+            self.customers = customers
+            self.admin = admin
+            self.menu_items = [item_id for (item_id,) in db.session.query(MenuItem.id)]
+            self.words = [word for (name,) in db.session.query(MenuItem.name) for word in name.split()]
+            self.orders = defaultdict(list)
+            for order_id, user_id in db.session.query(Order.id, Order.user_id).filter(Order.user_id.in_(customers)):
+                self.orders[user_id].append(order_id)
+            self.tokens = {
+                user_id: issue_access_token(db.session.get(User, user_id), expires_delta=timedelta(hours=6))
+                for user_id in customers + [admin]
+            }
+        self.mapping = {}
+        self.rng = random.Random(1)
+
+    def pick(self, kind, pseudonym, choices):
+        if pseudonym is None:
+            return self.rng.choice(choices)
+        key = (kind, pseudonym)
+        if key not in self.mapping:
+            self.mapping[key] = self.rng.choice(choices)
+        return self.mapping[key]
+
+    def user(self, event, name='user_id'):
+        return self.pick('user', event['params'].get(name) or event.get('actor'), self.customers)
+
+    def actor(self, event):
+        return self.pick('user', event.get('actor'), self.customers)
+
+    def order_of(self, user_id):
+        orders = self.orders.get(user_id)
+        if orders:
+            return user_id, self.rng.choice(orders)
+        owner = self.rng.choice([u for u in self.orders if self.orders[u]] or [None])
+        return (owner, self.rng.choice(self.orders[owner])) if owner is not None else (user_id, 0)
+
+
+def as_customer(build):
+    def wrapper(data, event):
+        user_id, request = build(data, event)
+        return dict(request, token=data.tokens[user_id])
+    return wrapper
+
+
+def as_admin(build):
+    def wrapper(data, event):
+        return dict(build(data, event), token=data.tokens[data.admin])
+    return wrapper
+
+
+def path_for(rule, **values):
+    path = rule
+    for name, value in values.items():
+        path = path.replace(f'<int:{name}>', str(value)).replace(f'<string:{name}>', str(value))
+    return path
+
+
+@as_customer
+def plain_get(data, event):
+    return data.actor(event), {'path': event['route']}
+
+
+@as_customer
+def menu_item(data, event):
+    return data.actor(event), {'path': path_for(event['route'], id=data.pick('menu_item', event['params'].get('id'), data.menu_items))}
+
+
+@as_customer
+def search(data, event):
+    length = event['query'].get('q') or 5
+    word = next((w for w in data.rng.sample(data.words, min(len(data.words), 20)) if len(w) >= 3), 'tea')
+    return data.actor(event), {'path': '/search', 'query': {'q': word[:max(3, int(length))]}}
+
+
+@as_customer
+def user_listing(data, event):
+    user_id = data.user(event)
+    return user_id, {'path': path_for(event['route'], user_id=user_id)}
+
+
+@as_customer
+def create_order(data, event):
+    user_id = data.actor(event)
+    return user_id, {'json': {
+        'user_id': user_id, 'menu_item_id': data.rng.choice(data.menu_items), 'quantity': data.rng.randint(1, 3),
+    }}
+
+
+@as_customer
+def reorder(data, event):
+    user_id, order_id = data.order_of(data.actor(event))
+    return user_id, {'path': path_for(event['route'], id=order_id)}
+
+
+@as_customer
+def create_reservation(data, event):
+    user_id = data.actor(event)
+    when = datetime.now() + timedelta(days=data.rng.randint(1, 30), hours=data.rng.randint(0, 12))
+    return user_id, {'json': {
+        'user_id': user_id, 'guest_size': data.rng.randint(1, 8), 'reservation_time': when.replace(microsecond=0).isoformat(),
+    }}
+
+
+@as_customer
+def create_review(data, event):
+    user_id = data.actor(event)
+    return user_id, {'json': {
+        'user_id': user_id, 'menu_item_id': data.rng.choice(data.menu_items),
+        'rating': data.rng.randint(1, 5), 'comment': 'load test',
+    }}
+
+
+def signup(data, event):
+    email = f'loadtest-{secrets.token_hex(6)}@example.com'
+    return {
+        'form': {'name': 'Load Test', 'email': email, 'phone_number': f'+{secrets.randbelow(10 ** 12)}', 'password': PASSWORD},
+        'files': {'profile_picture': ('avatar.gif', PICTURE, 'image/gif')},
+    }
+
+
+@as_admin
+def admin_get(data, event):
+    return {'path': path_for(event['route'], **event['params'])}
+
+
+@as_admin
+def update_status(data, event):
+    _, order_id = data.order_of(data.rng.choice(data.customers))
+    return {'path': path_for(event['route'], id=order_id), 'json': {'status': data.rng.choice(ORDER_STATUSES)}}
+
+
+# Routes the replayer knows how to rebuild. Anything else in a log (reports,
+# deletes, menu edits) is counted as skipped rather than guessed at.
+BUILDERS = {
+    ('GET', '/menu'): plain_get,
+    ('GET', '/menu_items'): plain_get,
+    ('GET', '/menu_items/<int:id>'): menu_item,
+    ('GET', '/search'): search,
+    ('GET', '/changes'): plain_get,
+    ('GET', '/availability-windows'): plain_get,
+    ('GET', '/schedules'): plain_get,
+    ('GET', '/me'): plain_get,
+    ('GET', '/users/<int:user_id>'): user_listing,
+    ('GET', '/orders/user/<int:user_id>'): user_listing,
+    ('GET', '/orders/user/<int:user_id>/recent'): user_listing,
+    ('GET', '/reservations/user/<int:user_id>'): user_listing,
+    ('GET', '/reviews/user/<int:user_id>'): user_listing,
+    ('POST', '/order_items'): create_order,
+    ('POST', '/orders/<int:id>/reorder'): reorder,
+    ('POST', '/reservations'): create_reservation,
+    ('POST', '/reviews'): create_review,
+    ('POST', '/signup'): signup,
+    ('GET', '/orders'): admin_get,
+    ('GET', '/users'): admin_get,
+    ('GET', '/reservations'): admin_get,
+    ('GET', '/reviews'): admin_get,
+    ('GET', '/export/<string:table>'): admin_get,
+    ('GET', '/menu-items/export'): admin_get,
+    ('GET', '/cache/stats'): admin_get,
+    ('PATCH', '/orders/<int:id>/status'): update_status,
+}
+
+
+def load_events(path):
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event['t'])
+    return events
+
+
+def build_requests(events, data):
+    built, skipped = [], defaultdict(int)
+    base = events[0]['t'] if events else 0
+    for event in events:
+        builder = BUILDERS.get((event['method'], event['route']))
+        if builder is None:
+            skipped[f"{event['method']} {event['route']}"] += 1
+            continue
+        request = builder(data, event)
+        request.setdefault('path', event['route'])
+        query = {k: v for k, v in event.get('query', {}).items() if v is not None and k != 'q'}
+        request['query'] = dict(query, **request.get('query', {}))
+        request['offset'] = event['t'] - base
+        request['method'] = event['method']
+        request['label'] = f"{event['method']} {event['route']}"
+        built.append(request)
+    return built, skipped
+
+
+local = threading.local()
+
+
+def send(url, request, due, results):
+    session = getattr(local, 'session', None)
+    if session is None:
+        session = local.session = requests.Session()
+    started = time.perf_counter()
+    lag = started - due
+    headers = {'Authorization': f"Bearer {request['token']}"} if request.get('token') else {}
+    files = {
+        name: (filename, io.BytesIO(content), mimetype)
+        for name, (filename, content, mimetype) in request.get('files', {}).items()
+    } or None
+    try:
+        response = session.request(
+            request['method'], url + request['path'], params=request['query'], headers=headers,
+            json=request.get('json'), data=request.get('form'), files=files, timeout=60,
+        )
+        status = response.status_code
+    except requests.RequestException:
+        status = None
+    results.append((request['label'], status, time.perf_counter() - started, lag))
+
+
+def replay(url, built, speed, threads):
+    results = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter() + 0.2
+        for request in built:
+            due = start + request['offset'] / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, url, request, due, results)
+    return results, time.perf_counter() - start
+
+
+def percentile(values, p):
+    if not values:
+        return math.nan
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summarize(results):
+    routes = defaultdict(lambda: {'latencies': [], 'errors': 0, 'client_errors': 0})
+    for label, status, latency, lag in results:
+        route = routes[label]
+        route['latencies'].append(latency * 1000)
+        if status is None or status >= 500:
+            route['errors'] += 1
+        elif status >= 400:
+            route['client_errors'] += 1
+    return routes
+
+
+def report(runs, speeds, factor):
+    print()
+    for speed in speeds:
+        results, elapsed = runs[speed]
+        latencies = [latency * 1000 for _, _, latency, _ in results]
+        errors = sum(1 for _, status, _, _ in results if status is None or status >= 500)
+        rejected = sum(1 for _, status, _, _ in results if status is not None and 400 <= status < 500)
+        lags = [lag * 1000 for _, _, _, lag in results]
+        print(
+            f'{speed:>5g}x  {len(results):>6} requests  {len(results) / elapsed:>8.1f} req/s  '
+            f'p50 {percentile(latencies, 0.5):>7.1f} ms  p95 {percentile(latencies, 0.95):>7.1f} ms  '
+            f'p99 {percentile(latencies, 0.99):>7.1f} ms  4xx {rejected:>4}  5xx {errors:>4}  dispatch lag p95 {percentile(lags, 0.95):>7.1f} ms'
+        )
+
+    summaries = {speed: summarize(runs[speed][0]) for speed in speeds}
+    labels = sorted({label for summary in summaries.values() for label in summary},
+                    key=lambda label: -len(summaries[speeds[0]].get(label, {'latencies': []})['latencies']))
+    print()
+    print(f"{'route':<48}" + ''.join(f'{f"{speed:g}x p50/p95":>20}' for speed in speeds) + '  breaks down at')
+    for label in labels:
+        cells, baseline, breaks = [], None, '-'
+        for speed in speeds:
+            route = summaries[speed].get(label)
+            if not route:
+                cells.append(f"{'-':>20}")
+                continue
+            p50, p95 = percentile(route['latencies'], 0.5), percentile(route['latencies'], 0.95)
+            cells.append(f'{p50:>9.1f}/{p95:<8.1f}'.rjust(20))
+            baseline = p95 if baseline is None else baseline
+            failing = route['errors'] > 0.01 * len(route['latencies'])
+            if breaks == '-' and (p95 > factor * baseline or failing):
+                breaks = f'{speed:g}x' + (' (5xx)' if failing else '')
+        print(f'{label:<48}' + ''.join(cells) + f'  {breaks}')
+    print(f'\n"breaks down at": first speed where p95 exceeds {factor:g}x its p95 at {speeds[0]:g}x, or over 1% 5xx.')
+
+
+def command_replay(args):
+    events = load_events(args.log)
+    if not events:
+        raise SystemExit('No events in log')
+    speeds = [float(speed) for speed in args.speeds.split(',')]
+    data = LocalData()
+    built, skipped = build_requests(events, data)
+    span = built[-1]['offset'] if built else 0
+    print(f'{len(built)} requests over {span:.1f}s from {args.log}; speeds {args.speeds}')
+    for label, count in sorted(skipped.items(), key=lambda item: -item[1]):
+        print(f'  skipped {count} x {label} (no replay builder)')
+
+    runs = {}
+    for speed in speeds:
+        print(f'replaying at {speed:g}x ...', flush=True)
+        runs[speed] = replay(args.url.rstrip('/'), built, speed, args.threads)
+    report(runs, speeds, args.factor)
+
+
+def command_synthesize(args):
+    mix = {}
+    for part in args.mix.split(','):
+        name, _, share = part.partition('=')
+        if name not in MIX_ROUTES:
+            raise SystemExit(f'unknown traffic class {name!r}; expected {", ".join(MIX_ROUTES)}')
+        mix[name] = float(share)
+
+    rng = random.Random(args.seed)
+    classes, weights = list(mix), list(mix.values())
+    # A few regulars account for most traffic, like real customers.
+    actors = [f'synthetic-{i}' for i in range(args.actors)]
+    actor_weights = [1 / (i + 1) for i in range(args.actors)]
+    t = time.time()
+    end = t + args.duration
+    count = 0
+    with open(args.out, 'w') as f:
+        while True:
+            t += rng.expovariate(args.rps)
+            if t >= end:
+                break
+            routes = MIX_ROUTES[rng.choices(classes, weights)[0]]
+            method, route, _ = rng.choices(routes, [weight for _, _, weight in routes])[0]
+            actor = rng.choices(actors, actor_weights)[0]
+            params = {}
+            if '<int:user_id>' in route:
+                params['user_id'] = actor
+            if '<int:id>' in route:
+                params['id'] = f'synthetic-{rng.randrange(1000)}'
+            event = {
+                't': round(t, 4), 'method': method, 'route': route, 'params': params,
+                'query': {'q': 5} if route == '/search' else {}, 'body': {}, 'actor': actor,
+            }
+            f.write(json.dumps(event, separators=(',', ':')) + '\n')
+            count += 1
+    print(f'Wrote {count} events ({args.mix}) to {args.out}')
+
+
+def sqlite_path(url):
+    # Flask-SQLAlchemy resolves relative SQLite paths against the instance
+    # folder.
+    return os.path.realpath(os.path.join(app.instance_path, make_url(url).database or ''))
+
+
+def command_seed(args):
+    # Seeding adds hundreds of accounts, including an admin with a known
+    # password, so the target has to be named explicitly and can't be the
+    # app's own database.
+    if not os.environ.get('DATABASE_URL'):
+        raise SystemExit('Set DATABASE_URL to the local copy to seed, e.g. DATABASE_URL=sqlite:///loadtest.db.')
+    with app.app_context():
+        url = db.engine.url
+        if url.get_backend_name() == 'sqlite' and os.path.realpath(url.database) == sqlite_path(DEFAULT_DATABASE_URI):
+            raise SystemExit(f'Refusing to seed the app database {url.database}; point DATABASE_URL at a copy.')
+        if url.get_backend_name() != 'sqlite' and not args.force:
+            raise SystemExit(f'Refusing to seed {db.engine.url!r}; pass --force if this really is a local copy.')
+        rng = random.Random(args.seed)
+        run = secrets.token_hex(3)
+        password = generate_password_hash(PASSWORD)
+
+        if not db.session.query(MenuItem.id).first():
+            menus = [Menu(name=f'Menu {i}', description='Synthetic menu') for i in range(5)]
+            db.session.add_all(menus)
+            db.session.flush()
+            db.session.execute(insert(MenuItem), [
+                {'name': f'Dish {m.id}-{j}', 'description': 'Synthetic dish', 'menu_id': m.id,
+                 'price_cents': rng.randint(200, 3000) * 10, 'available': True}
+                for m in menus for j in range(10)
+            ])
+        prices = dict(db.session.query(MenuItem.id, MenuItem.price_cents))
+        item_ids = list(prices)
+
+        def account(i, role):
+            return {
+                'name': f'Load {role} {i}', 'email': f'loadtest-{run}-{role}-{i}@example.com',
+                'phone_number': f'+9{run}{role[0]}{i:06d}', 'password': password,
+                'profile_picture': '', 'role': role,
+            }
+
+        rows = [account(i, 'customer') for i in range(args.users)] + [account(0, 'admin'), account(0, 'staff')]
+        user_ids = db.session.scalars(insert(User).returning(User.id), rows).all()
+        customers = user_ids[:args.users]
+
+        now = datetime.utcnow()
+        order_rows = [
+            {'user_id': rng.choice(customers), 'total_cents': 0, 'status': rng.choice(ORDER_STATUSES),
+             'created_at': now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))}
+            for _ in range(args.orders)
+        ]
+        order_ids = db.session.scalars(insert(Order).returning(Order.id), order_rows).all()
+        lines, totals = [], []
+        for order_id in order_ids:
+            total = 0
+            for menu_item_id in rng.sample(item_ids, rng.randint(1, min(3, len(item_ids)))):
+                quantity = rng.randint(1, 3)
+                lines.append({'order_id': order_id, 'menu_item_id': menu_item_id, 'quantity': quantity,
+                              'price_cents': prices[menu_item_id]})
+                total += quantity * prices[menu_item_id]
+            totals.append({'id': order_id, 'total_cents': total})
+        db.session.execute(insert(OrderItem), lines)
+        db.session.execute(db.update(Order), totals)
+
+        db.session.execute(insert(Reservation), [
+            {'user_id': rng.choice(customers), 'guest_size': rng.randint(1, 8),
+             'reservation_time': now + timedelta(hours=rng.randint(-24 * 60, 24 * 30))}
+            for _ in range(args.reservations)
+        ])
+        db.session.execute(insert(Review), [
+            {'user_id': rng.choice(customers), 'menu_item_id': rng.choice(item_ids),
+             'rating': rng.randint(1, 5), 'comment': 'Synthetic review'}
+            for _ in range(args.reviews)
+        ])
+        MenuItem.reconcile_ratings()
+        db.session.commit()
+        print(f'Seeded {args.users} customers, an admin and a staff member (password {PASSWORD!r}), '
+              f'{args.orders} orders, {args.reservations} reservations and {args.reviews} reviews')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='Add synthetic users, orders, reservations and reviews.')
+    seed.add_argument('--users', type=int, default=200)
+    seed.add_argument('--orders', type=int, default=2000)
+    seed.add_argument('--reservations', type=int, default=500)
+    seed.add_argument('--reviews', type=int, default=500)
+    seed.add_argument('--seed', type=int, default=1)
+    seed.add_argument('--force', action='store_true')
+    seed.set_defaults(run=command_seed)
+
+    synthesize = commands.add_parser('synthesize', help='Write a scenario log with a given traffic mix.')
+    synthesize.add_argument('--mix', default=DEFAULT_MIX)
+    synthesize.add_argument('--rps', type=float, default=20)
+    synthesize.add_argument('--duration', type=float, default=60)
+    synthesize.add_argument('--actors', type=int, default=200)
+    synthesize.add_argument('--seed', type=int, default=1)
+    synthesize.add_argument('--out', default='scenario.ndjson')
+    synthesize.set_defaults(run=command_synthesize)
+
+    replay_parser = commands.add_parser('replay', help='Replay a recorded or synthesized log.')
+    replay_parser.add_argument('log')
+    replay_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    replay_parser.add_argument('--speeds', default='1,2,4,8')
+    replay_parser.add_argument('--threads', type=int, default=64)
+    replay_parser.add_argument('--factor', type=float, default=3.0)
+    replay_parser.set_defaults(run=command_replay)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
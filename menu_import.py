@@ -0,0 +1,81 @@
+import csv
+import io
+
+from money import to_minor
+
+
+CSV_FIELDS = ['id', 'menu_id', 'name', 'description', 'price', 'image_url', 'available']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+def read_rows(request):
+    # Accepts a JSON list (or {"items": [...]}), a raw text/csv body or a
+    # multipart upload in the "file" field.
+    upload = request.files.get('file')
+    if upload:
+        return list(csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig')))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON list of items or a CSV body')
+    return data
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value if value is not None else '').strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"invalid boolean '{value}'")
+
+
+def validate_rows(rows, menu_ids):
+    items = []
+    errors = []
+    seen = set()
+
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': index, 'error': 'row must be an object'})
+            continue
+        try:
+            name = str(row.get('name') or '')
+            if not name.strip():
+                raise ValueError('name is required')
+
+            menu_id = int(row.get('menu_id'))
+            if menu_id not in menu_ids:
+                raise ValueError(f'menu {menu_id} does not exist')
+
+            price_cents = to_minor(row.get('price'))
+            if price_cents < 0:
+                raise ValueError('price must not be negative')
+
+            key = (menu_id, name)
+            if key in seen:
+                raise ValueError(f"duplicate item '{name}' for menu {menu_id}")
+            seen.add(key)
+
+            item = {'name': name, 'menu_id': menu_id, 'price_cents': price_cents}
+            # Optional columns are only written when supplied, so an upsert
+            # does not blank out fields the import left out.
+            for field in ('description', 'image_url'):
+                if field in row:
+                    item[field] = row[field] or None
+            if 'available' in row:
+                item['available'] = parse_bool(row['available'])
+            items.append(item)
+        except (TypeError, ValueError) as e:
+            errors.append({'row': index, 'error': str(e)})
+
+    return items, errors
+
@@ -0,0 +1,50 @@
+"""serialise postgres change log writes
+
+Revision ID: 3c8d1f7a2b95
+Revises: 9f152def4a70
+Create Date: 2026-10-19 19:48:02.114527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8d1f7a2b95'
+down_revision = '9f152def4a70'
+branch_labels = None
+depends_on = None
+
+
+# Seqs drawn by concurrent transactions could commit out of order, letting
+# a client's token move past an entry that was not yet visible. The
+# advisory lock makes change_log writers commit in seq order.
+def record_change(locked):
+    lock = "    PERFORM pg_advisory_xact_lock(hashtext('change_log'));\n" if locked else ''
+    return f"""
+CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+DECLARE
+    changed_id integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_id := OLD.id;
+    ELSE
+        changed_id := NEW.id;
+    END IF;
+{lock}    DELETE FROM change_log WHERE table_name = TG_TABLE_NAME AND row_id = changed_id;
+    INSERT INTO change_log (table_name, row_id, op, changed_at)
+    VALUES (TG_TABLE_NAME, changed_id, CASE WHEN TG_OP = 'DELETE' THEN 'delete' ELSE 'upsert' END, now());
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(record_change(locked=True))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(record_change(locked=False))
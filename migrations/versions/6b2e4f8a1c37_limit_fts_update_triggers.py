@@ -0,0 +1,49 @@
+"""limit fts update triggers to indexed columns
+
+Revision ID: 6b2e4f8a1c37
+Revises: d9a893b84cc4
+Create Date: 2026-10-19 19:24:08.913554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e4f8a1c37'
+down_revision = 'd9a893b84cc4'
+branch_labels = None
+depends_on = None
+
+
+# The update triggers used to fire on any column, so every rating
+# aggregate update on menu_items also rewrote the item's FTS row.
+INDEXES = {
+    'menu_items': ['name', 'description'],
+    'reviews': ['comment'],
+}
+
+
+def recreate_update_triggers(limited):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, columns in INDEXES.items():
+        fts = f'{table}_fts'
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f'new.{c}' for c in columns)
+        old_cols = ', '.join(f'old.{c}' for c in columns)
+        event = f'UPDATE OF {cols}' if limited else 'UPDATE'
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_au")
+        op.execute(
+            f"CREATE TRIGGER {table}_fts_au AFTER {event} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+
+
+def upgrade():
+    recreate_update_triggers(limited=True)
+
+
+def downgrade():
+    recreate_update_triggers(limited=False)
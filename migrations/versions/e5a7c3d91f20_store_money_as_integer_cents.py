@@ -0,0 +1,47 @@
+"""store money as integer cents
+
+Revision ID: e5a7c3d91f20
+Revises: 401fb5402bd4
+Create Date: 2026-10-19 19:20:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c3d91f20'
+down_revision = '401fb5402bd4'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('menu_items', 'price', 'price_cents'),
+    ('order_items', 'price', 'price_cents'),
+    ('orders', 'total', 'total_cents'),
+    ('order_items_archive', 'price', 'price_cents'),
+    ('orders_archive', 'total', 'total_cents'),
+]
+
+
+# Plain ADD/DROP COLUMN rather than batch mode: rebuilding menu_items on
+# SQLite would drop its search and change-log triggers.
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, old, new in COLUMNS:
+        op.add_column(table, sa.Column(new, sa.Integer(), nullable=False, server_default='0'))
+        op.execute(f"UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS INTEGER)")
+        op.drop_column(table, old)
+        if postgres:
+            op.alter_column(table, new, server_default=None)
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table, old, new in COLUMNS:
+        op.add_column(table, sa.Column(old, sa.Float(), nullable=False, server_default='0'))
+        op.execute(f"UPDATE {table} SET {old} = {new} / 100.0")
+        op.drop_column(table, new)
+        if postgres:
+            op.alter_column(table, old, server_default=None)
@@ -1,14 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy_serializer import SerializerMixin
 from datetime import datetime,timezone,timedelta
+import json
 from flask_jwt_extended import create_access_token
 from werkzeug.security import generate_password_hash, check_password_hash
+from replicas import RoutingSession
+from money import to_major
 
 metadata = MetaData(naming_convention={
+    "ix": "ix_%(column_0_label)s",
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={"class_": RoutingSession})
 
 
 class User(db.Model):
@@ -21,6 +26,7 @@ class User(db.Model):
     password = db.Column(db.String(128), nullable=False)
     profile_picture = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='customer')
+    role_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     orders = db.relationship('Order', backref='customer', lazy=True, cascade='all, delete-orphan')
     reservations = db.relationship('Reservation', back_populates='user', cascade='all, delete-orphan')
@@ -71,10 +77,12 @@ class MenuItem(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False)
     image_url = db.Column(db.String(200))
     available = db.Column(db.Boolean, default=True)
     menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'), nullable=False)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     order_items = db.relationship('OrderItem', backref='menu_item', lazy=True)
     reviews = db.relationship('Review', backref='item', lazy=True)
@@ -84,12 +92,137 @@ class MenuItem(db.Model):
             "id": self.id,
             "name": self.name,
             "description": self.description,
-            "price": self.price,
+            "price": to_major(self.price_cents),
             "image_url": self.image_url,
             "available": self.available,
             "menu_id": self.menu_id,
+            "rating_count": self.rating_count,
+            "rating_sum": self.rating_sum,
+            "rating_average": round(self.rating_sum / self.rating_count, 2) if self.rating_count else None,
         }
 
+    @classmethod
+    def adjust_rating(cls, menu_item_id, count, total):
+        # Applied as a single UPDATE in the caller's transaction so concurrent
+        # reviews never lose an increment.
+        if menu_item_id is None:
+            return
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id == menu_item_id)
+            .values(rating_count=cls.rating_count + count, rating_sum=cls.rating_sum + total)
+        )
+
+    @classmethod
+    def reconcile_ratings(cls):
+        # Archived reviews still count towards an item's rating.
+        reviews = db.union_all(
+            db.select(Review.menu_item_id, Review.rating),
+            db.select(ArchivedReview.menu_item_id, ArchivedReview.rating),
+        ).subquery()
+        totals = (
+            db.select(reviews.c.menu_item_id, db.func.count(), db.func.sum(reviews.c.rating))
+            .where(reviews.c.menu_item_id.isnot(None))
+            .group_by(reviews.c.menu_item_id)
+        )
+        db.session.execute(db.update(cls).values(rating_count=0, rating_sum=0))
+        rows = [
+            {"id": menu_item_id, "rating_count": count, "rating_sum": total}
+            for menu_item_id, count, total in db.session.execute(totals)
+        ]
+        if rows:
+            db.session.execute(db.update(cls), rows)
+        return len(rows)
+
+
+class CatalogueVersion(db.Model):
+    __tablename__ = 'catalogue_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
+    @classmethod
+    def bump(cls):
+        # Joins the caller's transaction; the caller commits.
+        current = db.session.get(cls, 1)
+        if current is None:
+            current = cls(id=1, version=0)
+            db.session.add(current)
+        current.version += 1
+        return current.version
+
+
+
+class ListingVersion(db.Model):
+    # One counter per user and listing kind (orders, reservations, reviews),
+    # bumped by every write that changes the listing. The row with
+    # user_id 0 and kind '*' is bumped by bulk changes such as archiving and
+    # applies to every listing.
+    __tablename__ = 'listing_versions'
+
+    KINDS = ('orders', 'reservations', 'reviews')
+    ALL = (0, '*')
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    kind = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def bump(cls, user_id, kind=None):
+        # Joins the caller's transaction; the caller commits. An upsert, so
+        # concurrent writers never lose an increment.
+        if user_id is None:
+            keys = [cls.ALL]
+        else:
+            keys = [(int(user_id), k) for k in ((kind,) if kind else cls.KINDS)]
+        insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+        statement = insert(cls).values([{'user_id': u, 'kind': k, 'version': 1} for u, k in keys])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'kind'], set_={'version': cls.version + 1}
+        ))
+
+    @classmethod
+    def current(cls, user_id, kind):
+        # Read through the request's routing, i.e. from the same database the
+        # listing itself is read from; a write and its bump replicate together.
+        rows = db.session.execute(
+            db.select(cls.user_id, cls.version).where(
+                ((cls.user_id == user_id) & (cls.kind == kind)) | ((cls.user_id == cls.ALL[0]) & (cls.kind == cls.ALL[1]))
+            )
+        ).all()
+        versions = dict(rows)
+        return versions.get(cls.ALL[0], 0), versions.get(user_id, 0)
+
+
+class AvailabilityWindow(db.Model):
+    __tablename__ = 'availability_windows'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    menu_id = db.Column(db.Integer, db.ForeignKey('menus.id'), index=True)
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_items.id'), index=True)
+    # Weekdays the window opens on, Monday = 0, e.g. "01234" for weekdays.
+    days = db.Column(db.String(7), nullable=False, default='0123456')
+    start_time = db.Column(db.Time, nullable=False)
+    # An end at or before the start runs past midnight.
+    end_time = db.Column(db.Time, nullable=False)
+
+    menu = db.relationship('Menu')
+    menu_item = db.relationship('MenuItem')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "menu_id": self.menu_id,
+            "menu_item_id": self.menu_item_id,
+            "days": self.days,
+            "start_time": self.start_time.strftime("%H:%M"),
+            "end_time": self.end_time.strftime("%H:%M"),
+        }
+
+
+
+ORDER_STATUSES = ('placed', 'preparing', 'ready', 'served')
 
 
 class Order(db.Model):
@@ -97,27 +230,54 @@ class Order(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    total = db.Column(db.Float, nullable=False)
+    total_cents = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='placed', server_default='placed')
     created_at = db.Column(db.DateTime, default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
 
     items = db.relationship('OrderItem', backref='parent_order', lazy=True)
     user = db.relationship('User', back_populates='orders')
 
+    __table_args__ = (
+        db.Index('ix_orders_user_id_created_at', 'user_id', created_at.desc(), id.desc()),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
             "user_id": self.user_id,
             "user_name": self.user.name,
             "total": self.total_amount,
+            "status": self.status,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "items": [item.to_dict() for item in self.items]
         }
 
+    def status_event(self):
+        return {
+            "type": "order_status",
+            "order_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "updated_at": (self.updated_at or self.created_at or datetime.utcnow()).isoformat(),
+        }
+
     @property
     def total_amount(self):
-        return sum(item.price * item.quantity for item in self.items)
+        return to_major(self.total_cents)
+
+    @classmethod
+    def reconcile_totals(cls):
+        # Recomputes every stored total as an integer SUM over its items.
+        items_total = (
+            db.select(db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.price_cents), 0))
+            .where(OrderItem.order_id == cls.id)
+            .scalar_subquery()
+        )
+        return db.session.execute(
+            db.update(cls).where(cls.total_cents != items_total).values(total_cents=items_total)
+        ).rowcount
 
 
 
@@ -128,7 +288,7 @@ class OrderItem(db.Model):
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_items.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False)
 
     def to_dict(self):
         return {
@@ -136,7 +296,7 @@ class OrderItem(db.Model):
             "order_id": self.order_id,
             "menu_item_id": self.menu_item_id,
             "quantity": self.quantity,
-            "price": self.price,
+            "price": to_major(self.price_cents),
         }
 
 
@@ -216,3 +376,144 @@ class Schedule(db.Model):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+
+# Rows older than the retention horizon are moved here by archive.py. The
+# tables mirror the live ones and reuse their serialization, so archived
+# history reads exactly like live data. The original id is kept, but SQLite
+# can hand out a deleted id again, so each table has its own primary key.
+class ArchivedOrder(db.Model):
+    __tablename__ = 'orders_archive'
+
+    archive_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    total_cents = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+
+    items = db.relationship('ArchivedOrderItem', lazy=True)
+    user = db.relationship('User')
+
+    to_dict = Order.to_dict
+    status_event = Order.status_event
+    total_amount = Order.total_amount
+
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'order_items_archive'
+
+    archive_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(db.Integer, nullable=False)
+    order_archive_id = db.Column(db.Integer, db.ForeignKey('orders_archive.archive_id'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_items.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False)
+
+    to_dict = OrderItem.to_dict
+
+
+class ArchivedReservation(db.Model):
+    __tablename__ = 'reservations_archive'
+
+    archive_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    reservation_time = db.Column(db.DateTime, nullable=False)
+    guest_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+
+    user = db.relationship('User')
+
+    to_dict = Reservation.to_dict
+
+
+class ArchivedReview(db.Model):
+    __tablename__ = 'reviews_archive'
+
+    archive_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_items.id'), nullable=True)
+    rating = db.Column(db.Integer, nullable=False)
+    comment = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+
+    user = db.relationship('User')
+
+    to_dict = Review.to_dict
+
+
+class ReportJob(db.Model):
+    __tablename__ = 'report_jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    file_path = db.Column(db.String(300))
+    row_count = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": json.loads(self.params),
+            "status": self.status,
+            "row_count": self.row_count,
+            "error": self.error,
+            "requested_by": self.requested_by,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    # AUTOINCREMENT keeps seq strictly increasing on SQLite even after the
+    # newest entry has been superseded and deleted.
+    __table_args__ = (
+        db.Index('ix_change_log_table_name_row_id', 'table_name', 'row_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, default=db.func.now())
+
+
+class WriteBehindOffset(db.Model):
+    __tablename__ = 'write_behind_offsets'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+
+
+class WriteBehindDeadLetter(db.Model):
+    # Outbox entries that failed to apply. They are recorded in the same
+    # transaction that moves the offset past them, so the queue keeps
+    # draining and nothing is lost.
+    __tablename__ = 'write_behind_dead_letters'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    queue = db.Column(db.String(50), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    error = db.Column(db.Text, nullable=False)
+    failed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,29 @@
+from decimal import Decimal, InvalidOperation
+
+
+# Amounts are stored as integer minor units (cents), so sums are exact and
+# can be done in SQL. Conversion happens only at the edges: parsing request
+# input and serializing responses.
+MINOR_UNITS = 100
+
+
+def to_minor(value):
+    if isinstance(value, bool):
+        raise ValueError(f'invalid amount: {value!r}')
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f'invalid amount: {value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'invalid amount: {value!r}')
+
+    minor = amount * MINOR_UNITS
+    if minor != minor.to_integral_value():
+        raise ValueError(f'amount {value!r} has more than two decimal places')
+    return int(minor)
+
+
+def to_major(minor):
+    if minor is None:
+        return None
+    return minor / MINOR_UNITS
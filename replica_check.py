@@ -0,0 +1,114 @@
+import argparse
+import io
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+
+# Checks read-replica routing against a running server started with
+# READ_REPLICA_URIS and READ_REPLICA_DEBUG=1, e.g.:
+#
+#   READ_REPLICA_URIS=sqlite:///replica0.db,sqlite:///replica1.db READ_REPLICA_DEBUG=1 flask run
+#   flask replicas-sync
+#   python replica_check.py --url http://127.0.0.1:5000 --staleness 5
+#
+# Two fresh customers sign up. The reader only ever reads and must always
+# be sent to a replica. The writer creates a reservation and must then be
+# served by the primary, and see that reservation, until the staleness
+# window has passed, after which its reads go back to the replicas. Each
+# client keeps its own cookies, as a browser would.
+
+PICTURE = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+PRIMARY = 'primary'
+
+
+class Client:
+
+    def __init__(self, url, run, label):
+        self.url = url
+        self.http = requests.Session()
+        response = self.http.post(
+            f'{url}/signup',
+            data={
+                'name': f'replica check {label}',
+                'email': f'replica-{run}-{label}@example.com',
+                'phone_number': f'+{run}-{label}',
+                'password': 'replica-check',
+            },
+            files={'profile_picture': ('avatar.gif', io.BytesIO(PICTURE), 'image/gif')},
+            timeout=30,
+        )
+        response.raise_for_status()
+        body = response.json()
+        self.user_id = body['user']['id']
+        self.http.headers['Authorization'] = f"Bearer {body['access_token']}"
+        # The signup was a write; start from a clean, unpinned client.
+        self.http.cookies.clear()
+
+    def get(self, path):
+        response = self.http.get(f'{self.url}{path}', timeout=30)
+        route = response.headers.get('X-DB-Route')
+        if route is None:
+            sys.exit('FAILED: no X-DB-Route header; start the server with READ_REPLICA_DEBUG=1')
+        return response, route
+
+    def routes(self, path, n):
+        return [self.get(path)[1] for _ in range(n)]
+
+
+def check(failures, ok, message):
+    print(f"{'ok  ' if ok else 'FAIL'} {message}")
+    if not ok:
+        failures.append(message)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--staleness', type=float, default=5, help='READ_REPLICA_STALENESS of the server')
+    parser.add_argument('--reads', type=int, default=20)
+    args = parser.parse_args()
+
+    run = secrets.token_hex(4)
+    reader = Client(args.url, run, 'reader')
+    writer = Client(args.url, run, 'writer')
+    failures = []
+
+    routes = reader.routes('/schedules', args.reads)
+    check(failures, PRIMARY not in routes, f'reader GETs go to replicas: {sorted(set(routes))}')
+    routes = writer.routes('/schedules', args.reads)
+    check(failures, PRIMARY not in routes, f'writer GETs go to replicas before writing: {sorted(set(routes))}')
+
+    when = (datetime.now() + timedelta(days=1)).replace(microsecond=0).isoformat()
+    response = writer.http.post(
+        f'{args.url}/reservations',
+        json={'user_id': writer.user_id, 'guest_size': 2, 'reservation_time': when},
+        timeout=30,
+    )
+    check(failures, response.status_code in (201, 202), f'writer creates a reservation ({response.status_code})')
+    pinned_until = time.monotonic() + args.staleness
+
+    listing = f'/reservations/user/{writer.user_id}'
+    response, route = writer.get(listing)
+    check(failures, route == PRIMARY, f'writer reads its listing from the primary ({route})')
+    check(failures, len(response.json()) == 1, f'writer sees its reservation ({len(response.json())} rows)')
+    routes = writer.routes('/schedules', args.reads)
+    check(failures, set(routes) == {PRIMARY}, f'writer stays on the primary inside the window: {sorted(set(routes))}')
+    routes = reader.routes(listing, args.reads)
+    check(failures, PRIMARY not in routes, f'reader is not pinned by the writer: {sorted(set(routes))}')
+
+    time.sleep(max(0, pinned_until - time.monotonic()) + 1)
+    routes = writer.routes('/schedules', args.reads)
+    check(failures, PRIMARY not in routes, f'writer returns to replicas after the window: {sorted(set(routes))}')
+
+    if failures:
+        print(f'FAILED: {len(failures)} checks')
+        sys.exit(1)
+    print('OK: routing, read-your-writes pin and pin expiry all hold')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import random
+import time
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+PRIMARY_COOKIE = 'fud_read_primary_until'
+
+
+class RoutingSession(Session):
+    # Sends reads to the replica chosen for the current request, if any.
+    # Flushes and DML always go to the primary, and once a session has
+    # written, the rest of its reads follow so it sees its own changes.
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['primary'] = True
+            elif not self.info.get('primary') and has_request_context():
+                replica = g.get('read_replica')
+                if replica is not None:
+                    return self._db.engines[replica]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Safe requests are routed to a random replica unless the caller wrote
+# something within the staleness window, tracked both in this process and
+# in a cookie so the guarantee holds when the next request lands on a
+# different worker.
+class ReplicaRouter:
+
+    def __init__(self, app=None):
+        self.recent_writers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('READ_REPLICA_URIS', [])
+        app.config.setdefault('READ_REPLICA_STALENESS', 5)
+        app.config.setdefault('READ_REPLICA_DEBUG', False)
+        self.app = app
+        self.replicas = [f'replica_{i}' for i in range(len(app.config['READ_REPLICA_URIS']))]
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        for key, uri in zip(self.replicas, app.config['READ_REPLICA_URIS']):
+            binds[key] = uri
+        app.before_request(self.route_request)
+        app.after_request(self.record_write)
+        app.extensions['replica_router'] = self
+
+    def _identity(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except Exception:
+            return None
+
+    def route_request(self):
+        g.read_replica = None
+        if not self.replicas or request.method not in SAFE_METHODS:
+            return
+
+        now = time.time()
+        identity = self._identity()
+        if identity is not None and self.recent_writers.get(str(identity), 0) > now:
+            return
+        try:
+            if float(request.cookies.get(PRIMARY_COOKIE, 0)) > now:
+                return
+        except ValueError:
+            pass
+
+        g.read_replica = random.choice(self.replicas)
+
+    def record_write(self, response):
+        if self.app.config['READ_REPLICA_DEBUG']:
+            response.headers['X-DB-Route'] = g.get('read_replica') or 'primary'
+        if not self.replicas or request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+
+        until = time.time() + self.app.config['READ_REPLICA_STALENESS']
+        identity = self._identity()
+        if identity is not None:
+            if len(self.recent_writers) > 10000:
+                now = time.time()
+                self.recent_writers = {k: v for k, v in self.recent_writers.items() if v > now}
+            self.recent_writers[str(identity)] = until
+        response.set_cookie(PRIMARY_COOKIE, str(until), max_age=self.app.config['READ_REPLICA_STALENESS'])
+        return response
+
+    def sync_sqlite(self, primary):
+        # Local stand-in for replication: copies the primary SQLite database
+        # into each replica file with the online backup API.
+        copied = []
+        for key in self.replicas:
+            replica = self.app.extensions['sqlalchemy'].engines[key]
+            source, target = primary.raw_connection(), replica.raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                source.close()
+                target.close()
+            copied.append(str(replica.url))
+        return copied
@@ -0,0 +1,215 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from money import to_major
+from models import (
+    db, User, MenuItem, Order, OrderItem, Reservation, Schedule, ReportJob,
+    ArchivedOrder, ArchivedOrderItem, ArchivedReservation,
+)
+
+
+# Reports are built by a separate worker process (`flask reports-worker`)
+# and written to CSV under the instance folder. Every report reads its
+# source rows in batches and keeps only running totals, so memory depends on
+# the number of output rows, not on the size of the tables.
+BATCH_SIZE = 1000
+
+
+def month_range(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def stream(statement):
+    return db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+
+
+def sales_by_item(month):
+    start, end = month_range(month)
+    # Orders from the month may already have been archived.
+    lines = db.union_all(
+        db.select(OrderItem.menu_item_id, OrderItem.quantity, OrderItem.price_cents)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.created_at >= start, Order.created_at < end),
+        db.select(ArchivedOrderItem.menu_item_id, ArchivedOrderItem.quantity, ArchivedOrderItem.price_cents)
+        .join(ArchivedOrder, ArchivedOrder.archive_id == ArchivedOrderItem.order_archive_id)
+        .where(ArchivedOrder.created_at >= start, ArchivedOrder.created_at < end),
+    ).subquery()
+    totals = (
+        db.select(
+            MenuItem.id, MenuItem.name,
+            db.func.sum(lines.c.quantity),
+            db.func.sum(lines.c.quantity * lines.c.price_cents),
+        )
+        .join(lines, lines.c.menu_item_id == MenuItem.id)
+        .group_by(MenuItem.id, MenuItem.name)
+        .order_by(MenuItem.id)
+    )
+    for menu_item_id, name, quantity, revenue in stream(totals):
+        yield [menu_item_id, name, quantity, to_major(revenue or 0)]
+
+
+def staff_hours(month):
+    start, end = month_range(month)
+    shifts = (
+        db.select(Schedule.staff_id, User.name, Schedule.date, Schedule.start_time, Schedule.end_time, Schedule.is_completed)
+        .join(User, User.id == Schedule.staff_id)
+        .where(Schedule.date >= start.date(), Schedule.date < end.date())
+    )
+    totals = {}
+    for staff_id, name, date, start_time, end_time, is_completed in stream(shifts):
+        minutes = (datetime.combine(date, end_time) - datetime.combine(date, start_time)).total_seconds() / 60
+        if minutes < 0:
+            # Shift runs past midnight.
+            minutes += 24 * 60
+        row = totals.setdefault(staff_id, [staff_id, name, 0, 0, 0])
+        row[2] += 1
+        row[3] += minutes
+        row[4] += 1 if is_completed else 0
+
+    for staff_id in sorted(totals):
+        staff_id, name, shifts, minutes, completed = totals[staff_id]
+        yield [staff_id, name, shifts, completed, round(minutes / 60, 2)]
+
+
+def reservation_no_shows(month):
+    # There is no attendance flag, so a reservation counts as a no-show when
+    # the guest placed no order on the day of the booking. Bookings that
+    # are still to come are left out. Like sales_by_item, archived rows
+    # count: both reservations and orders may have been archived since.
+    # Reservations and orders are both read sorted by user and merged,
+    # holding one user's order dates at a time.
+    start, end = month_range(month)
+    cutoff = min(end, datetime.now())
+    booked = db.union_all(
+        db.select(Reservation.id, Reservation.user_id, Reservation.reservation_time, Reservation.guest_size)
+        .where(Reservation.reservation_time >= start, Reservation.reservation_time < cutoff),
+        db.select(ArchivedReservation.id, ArchivedReservation.user_id, ArchivedReservation.reservation_time, ArchivedReservation.guest_size)
+        .where(ArchivedReservation.reservation_time >= start, ArchivedReservation.reservation_time < cutoff),
+    ).subquery()
+    reservations = (
+        db.select(booked.c.id, booked.c.user_id, User.name, booked.c.reservation_time, booked.c.guest_size)
+        .join(User, User.id == booked.c.user_id)
+        .order_by(booked.c.user_id, booked.c.reservation_time)
+    )
+    placed = db.union_all(
+        db.select(Order.user_id, Order.created_at)
+        .where(Order.created_at >= start, Order.created_at < end + timedelta(days=1)),
+        db.select(ArchivedOrder.user_id, ArchivedOrder.created_at)
+        .where(ArchivedOrder.created_at >= start, ArchivedOrder.created_at < end + timedelta(days=1)),
+    ).subquery()
+    orders = iter(stream(
+        db.select(placed.c.user_id, placed.c.created_at).order_by(placed.c.user_id, placed.c.created_at)
+    ))
+
+    pending = next(orders, None)
+    current_user, order_dates = None, set()
+    for reservation_id, user_id, name, reservation_time, guest_size in stream(reservations):
+        if user_id != current_user:
+            current_user, order_dates = user_id, set()
+            while pending is not None and pending[0] < user_id:
+                pending = next(orders, None)
+            while pending is not None and pending[0] == user_id:
+                if pending[1] is not None:
+                    order_dates.add(pending[1].date())
+                pending = next(orders, None)
+
+        if reservation_time.date() not in order_dates:
+            yield [reservation_id, user_id, name, reservation_time.isoformat(), guest_size]
+
+
+REPORTS = {
+    'sales_by_item': {
+        'build': sales_by_item,
+        'fields': ['menu_item_id', 'name', 'quantity_sold', 'revenue'],
+    },
+    'staff_hours': {
+        'build': staff_hours,
+        'fields': ['staff_id', 'name', 'shifts', 'completed_shifts', 'hours'],
+    },
+    'reservation_no_shows': {
+        'build': reservation_no_shows,
+        'fields': ['reservation_id', 'user_id', 'user_name', 'reservation_time', 'guest_size'],
+    },
+}
+
+
+def claim_next_job(timeout):
+    # The conditional UPDATE makes the claim atomic, so several workers can
+    # poll the same table. A job still 'running' more than `timeout` seconds
+    # after it was claimed is taken to belong to a worker that died, and is
+    # claimed again; matching on the old started_at makes the takeover
+    # atomic, as with stale idempotency claims.
+    while True:
+        now = datetime.utcnow()
+        candidate = db.session.execute(
+            db.select(ReportJob.id, ReportJob.status, ReportJob.started_at)
+            .where(db.or_(
+                ReportJob.status == 'queued',
+                db.and_(ReportJob.status == 'running', ReportJob.started_at < now - timedelta(seconds=timeout)),
+            ))
+            .order_by(ReportJob.id)
+            .limit(1)
+        ).first()
+        if candidate is None:
+            return None
+        claimed = db.session.execute(
+            db.update(ReportJob)
+            .where(
+                ReportJob.id == candidate.id,
+                ReportJob.status == candidate.status,
+                ReportJob.started_at == candidate.started_at,
+            )
+            .values(status='running', started_at=now, error=None)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(ReportJob, candidate.id)
+
+
+def run_job(job, directory):
+    report = REPORTS[job.kind]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{job.kind}_{job.id}.csv')
+    # Per claim, so a worker that lost its lease never writes into the file
+    # the new holder is building.
+    started_at = job.started_at
+    partial = f'{path}.{started_at:%Y%m%d%H%M%S%f}.part'
+    try:
+        rows = 0
+        with open(partial, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(report['fields'])
+            for row in report['build'](**json.loads(job.params)):
+                writer.writerow(row)
+                rows += 1
+        os.replace(partial, path)
+        result = {'status': 'done', 'file_path': path, 'row_count': rows}
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(partial):
+            os.remove(partial)
+        result = {'status': 'failed', 'error': str(e)}
+
+    # Only the current lease holder records the outcome.
+    db.session.execute(
+        db.update(ReportJob)
+        .where(ReportJob.id == job.id, ReportJob.status == 'running', ReportJob.started_at == started_at)
+        .values(finished_at=datetime.utcnow(), **result)
+    )
+    db.session.commit()
+
+
+def run_worker(directory, interval=2.0, once=False, timeout=30 * 60):
+    while True:
+        job = claim_next_job(timeout)
+        if job is not None:
+            run_job(job, directory)
+            continue
+        if once:
+            return
+        time.sleep(interval)
@@ -0,0 +1,111 @@
+import re
+
+from sqlalchemy import text
+
+from models import db, MenuItem, Review
+
+
+# Each searchable table gets an external-content FTS5 table on SQLite (kept
+# in sync by triggers) or a generated tsvector column with a GIN index on
+# Postgres. Either way the index is maintained by the database on every
+# insert, update and delete, including bulk and write-behind inserts.
+INDEXES = {
+    'menu_items': {
+        'model': MenuItem,
+        'table': 'menu_items',
+        'columns': ['name', 'description'],
+    },
+    'reviews': {
+        'model': Review,
+        'table': 'reviews',
+        'columns': ['comment'],
+    },
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def sqlite_ddl(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+def postgres_ddl(table, columns):
+    document = " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {document})) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)",
+    ]
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Keeps autogenerate from trying to drop the FTS5 table and its shadow
+    # tables, which exist in the database but not in the models.
+    if type_ == 'table' and reflected and compare_to is None:
+        return not any(name.startswith(f"{index['table']}_fts") for index in INDEXES.values())
+    return True
+
+
+def create_indexes(connection, rebuild=False):
+    for index in INDEXES.values():
+        if connection.dialect.name == 'postgresql':
+            statements = postgres_ddl(index['table'], index['columns'])
+        else:
+            statements = sqlite_ddl(index['table'], index['columns'])
+            if rebuild:
+                fts = f"{index['table']}_fts"
+                statements.append(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        for statement in statements:
+            connection.execute(text(statement))
+
+
+def tokenize(query):
+    return [token.lower() for token in TOKEN_RE.findall(query or '')]
+
+
+def search(kind, query, limit=20):
+    # Every term must match; the last term is treated as a prefix so
+    # results narrow as the user types.
+    index = INDEXES[kind]
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    table = index['table']
+    if db.engine.dialect.name == 'postgresql':
+        terms = tokens[:-1] + [f'{tokens[-1]}:*']
+        sql = text(
+            f"SELECT id, ts_rank(search_vector, q) AS rank "
+            f"FROM {table}, to_tsquery('simple', :q) AS q "
+            f"WHERE search_vector @@ q ORDER BY rank DESC LIMIT :limit"
+        )
+        params = {'q': ' & '.join(terms), 'limit': limit}
+    else:
+        terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        # bm25() is lower-is-better, so negate it to match ts_rank.
+        sql = text(
+            f"SELECT rowid AS id, -bm25({table}_fts) AS rank FROM {table}_fts "
+            f"WHERE {table}_fts MATCH :q ORDER BY bm25({table}_fts) LIMIT :limit"
+        )
+        params = {'q': ' '.join(terms), 'limit': limit}
+
+    ranks = {row.id: row.rank for row in db.session.execute(sql, params)}
+    if not ranks:
+        return []
+
+    model = index['model']
+    rows = {row.id: row for row in model.query.filter(model.id.in_(ranks))}
+    return [(rows[row_id], ranks[row_id]) for row_id in ranks if row_id in rows]
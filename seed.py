@@ -1,5 +1,9 @@
 from app import app, db
-from models import Menu, MenuItem
+from models import Menu, MenuItem, AvailabilityWindow
+from money import to_minor
+from datetime import time
+import search
+import changes
 from faker import Faker
 import random
 
@@ -9,6 +13,9 @@ def seed_data():
     with app.app_context():
         db.drop_all()
         db.create_all()
+        with db.engine.begin() as connection:
+            search.create_indexes(connection, rebuild=True)
+            changes.create_triggers(connection)
 
         # --- Sample Menus ---
         menus = [
@@ -58,13 +65,16 @@ def seed_data():
                 menu_items = MenuItem(
                     name=name,
                     description=description,
-                    price=price,
+                    price_cents=to_minor(price),
                     image_url=image_url,
                     available=random.choice([True, True, True, False]),  # 75% available
                     menu=menu
                 )
                 db.session.add(menu_items)
 
+        # --- Availability Windows ---
+        db.session.add(AvailabilityWindow(menu=menus[0], start_time=time(7, 0), end_time=time(11, 0)))
+
         db.session.commit()
         print("✅ Database seeded!")
 
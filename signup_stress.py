@@ -0,0 +1,68 @@
+import argparse
+import io
+import secrets
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+# Hammers /signup in parallel against a running server and checks that the
+# unique indexes hold, e.g.:
+#
+#   python signup_stress.py --url http://127.0.0.1:5000 --threads 32 --accounts 20 --attempts 10
+#
+# Every account is submitted --attempts times at once (with a different name
+# and, for half of them, a different phone number). Exactly one attempt per
+# account must succeed, the rest must be rejected with 400, and none may
+# fail with a 500.
+
+PICTURE = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+
+
+def attempt(url, email, phone_number, n):
+    response = requests.post(
+        f'{url}/signup',
+        data={
+            'name': f'stress {n}',
+            'email': email,
+            'phone_number': phone_number if n % 2 else f'{phone_number}-{n}',
+            'password': 'stress-password',
+        },
+        files={'profile_picture': ('avatar.gif', io.BytesIO(PICTURE), 'image/gif')},
+        timeout=30,
+    )
+    return email, response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--accounts', type=int, default=20)
+    parser.add_argument('--attempts', type=int, default=10)
+    args = parser.parse_args()
+
+    run = secrets.token_hex(4)
+    jobs = [
+        (f'stress-{run}-{i}@example.com', f'+{run}{i:04d}', n)
+        for n in range(args.attempts)
+        for i in range(args.accounts)
+    ]
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda job: attempt(args.url, *job), jobs))
+
+    statuses = Counter(status for _, status in results)
+    created = Counter(email for email, status in results if status == 200)
+    wrong = [email for email in {email for email, _ in results} if created[email] != 1]
+
+    print(f'{len(results)} signups, statuses: {dict(statuses)}')
+    if wrong or set(statuses) - {200, 400}:
+        print(f'FAILED: {len(wrong)} accounts without exactly one success')
+        sys.exit(1)
+    print(f'OK: {len(created)} accounts, each created exactly once')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity
+
+
+# Query parameters whose values say nothing about who is asking. Anything
+# else is recorded by name only, except the search text, which is reduced
+# to its length.
+SAFE_PARAMS = {'limit', 'available', 'include_archived', 'format', 'type', 'tables', 'upsert'}
+
+
+# Appends one NDJSON line per request to TRAFFIC_RECORD_PATH when it is set,
+# for loadtest.py to replay. Lines hold the route template, method, status,
+# timing and the shape of the request, never its content: path ids and the
+# caller become keyed hashes that are stable within a recording (so "the
+# same user again" survives) but can't be traced back, and bodies are
+# reduced to their field names. The key is TRAFFIC_RECORD_SALT, which is
+# required: every worker and every restart has to hash the same user to
+# the same pseudonym, and the salt must not be stored with the recording.
+class TrafficRecorder:
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TRAFFIC_RECORD_PATH', None)
+        app.config.setdefault('TRAFFIC_RECORD_SAMPLE', 1.0)
+        app.config.setdefault('TRAFFIC_RECORD_SALT', None)
+        self.app = app
+        self.path = app.config['TRAFFIC_RECORD_PATH']
+        salt = app.config['TRAFFIC_RECORD_SALT']
+        if self.path and not salt:
+            raise RuntimeError('TRAFFIC_RECORD_PATH is set but TRAFFIC_RECORD_SALT is not')
+        self.salt = salt.encode() if salt else secrets.token_bytes(16)
+        if self.path:
+            app.before_request(self.start_timer)
+            app.after_request(self.record)
+        app.extensions['traffic_recorder'] = self
+
+    def pseudonym(self, kind, value):
+        return hmac.new(self.salt, f'{kind}:{value}'.encode(), hashlib.sha256).hexdigest()[:12]
+
+    def start_timer(self):
+        g.traffic_started = time.perf_counter()
+
+    def _actor(self):
+        # Reads the identity the view already verified, if any.
+        try:
+            identity = get_jwt_identity()
+        except Exception:
+            return None
+        return self.pseudonym('user', identity) if identity is not None else None
+
+    def _body_shape(self):
+        if request.mimetype == 'application/json':
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                return {'json': sorted(body)}
+            if isinstance(body, list):
+                return {'json_list': len(body)}
+            return {}
+        if request.mimetype == 'multipart/form-data':
+            return {'form': sorted(request.form), 'files': sorted(request.files)}
+        return {'bytes': request.content_length or 0} if request.content_length else {}
+
+    def record(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None or request.url_rule is None or response.mimetype == 'text/event-stream':
+            return response
+        sample = self.app.config['TRAFFIC_RECORD_SAMPLE']
+        if sample < 1 and secrets.randbelow(10 ** 6) >= sample * 10 ** 6:
+            return response
+
+        query = {}
+        for name in request.args:
+            if name in SAFE_PARAMS:
+                query[name] = request.args.get(name)
+            elif name == 'q':
+                query[name] = len(request.args.get(name))
+            else:
+                query[name] = None
+
+        entry = {
+            # Wall-clock time, so logs from several workers can be merged.
+            't': round(time.time(), 4),
+            'method': request.method,
+            'route': request.url_rule.rule,
+            # Ids are pseudonymized; other path values (e.g. an export table
+            # name) are part of the route's shape and kept.
+            'params': {
+                name: self.pseudonym('user' if name == 'user_id' else name, value) if isinstance(value, int) else value
+                for name, value in (request.view_args or {}).items()
+            },
+            'query': query,
+            'body': self._body_shape(),
+            'actor': self._actor(),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'bytes': response.calculate_content_length(),
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(line)
+        return response
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from models import db, WriteBehindOffset, WriteBehindDeadLetter
+
+
+# Validated writes are appended to a local SQLite outbox and acknowledged
+# straight away. A background worker drains the outbox in batches, applying
+# each batch to the main database in a single transaction together with the
+# last applied sequence number, so a crash at any point replays cleanly.
+# Each entry is applied under its own savepoint; one that fails is moved to
+# write_behind_dead_letters in that same transaction instead of blocking
+# the entries queued behind it.
+class WriteBehindQueue:
+
+    def __init__(self, app=None, name='default'):
+        self.name = name
+        self.builders = {}
+        self.committed_callbacks = []
+        self.app = None
+        self._apply_lock = threading.Lock()
+        self._worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('WRITE_BEHIND_ENABLED', False)
+        app.config.setdefault('WRITE_BEHIND_PATH', os.path.join(app.instance_path, 'write_behind.db'))
+        app.config.setdefault('WRITE_BEHIND_BATCH_SIZE', 200)
+        app.config.setdefault('WRITE_BEHIND_INTERVAL', 0.5)
+        self.app = app
+        self.path = app.config['WRITE_BEHIND_PATH']
+        app.extensions['write_behind'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.app and self.app.config['WRITE_BEHIND_ENABLED'])
+
+    def register(self, kind):
+        def decorator(builder):
+            self.builders[kind] = builder
+            return builder
+        return decorator
+
+    def after_commit(self, callback):
+        # Called with the set of kinds applied, once their batch has
+        # committed to the main database.
+        self.committed_callbacks.append(callback)
+        return callback
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' kind TEXT NOT NULL,'
+            ' user_id INTEGER,'
+            ' payload TEXT NOT NULL,'
+            ' created_at TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_outbox_user_id ON outbox (user_id)')
+        return conn
+
+    def enqueue(self, kind, user_id, payload):
+        if kind not in self.builders:
+            raise KeyError(f"No write-behind builder registered for '{kind}'")
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                'INSERT INTO outbox (kind, user_id, payload, created_at) VALUES (?, ?, ?, ?)',
+                (kind, user_id, json.dumps(payload), datetime.utcnow().isoformat())
+            )
+            seq = cur.lastrowid
+        finally:
+            conn.close()
+        return seq
+
+    def has_pending(self, user_id=None):
+        conn = self._connect()
+        try:
+            if user_id is None:
+                row = conn.execute('SELECT 1 FROM outbox LIMIT 1').fetchone()
+            else:
+                row = conn.execute('SELECT 1 FROM outbox WHERE user_id = ? LIMIT 1', (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None
+
+    def flush(self, limit=None):
+        # Must run inside an application context. Returns the number of
+        # entries applied to the main database; dead-lettered ones are not
+        # counted.
+        applied = 0
+        with self._apply_lock:
+            while True:
+                count, more = self._apply_batch(limit or self.app.config['WRITE_BEHIND_BATCH_SIZE'])
+                applied += count
+                if not more:
+                    return applied
+
+    def _apply_batch(self, batch_size):
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the outbox write lock, so only one
+            # process applies a given range even with several web workers.
+            conn.execute('BEGIN IMMEDIATE')
+            # Listing reads flush from GET requests, which may be routed to a
+            # replica; the offset (and everything the builders read) must
+            # come from the primary that the batch is written to.
+            db.session.info['primary'] = True
+            offset = db.session.get(WriteBehindOffset, self.name)
+            if offset is None:
+                offset = WriteBehindOffset(name=self.name, last_seq=0)
+                db.session.add(offset)
+
+            # Entries at or below the offset were committed before a crash
+            # but never removed from the outbox.
+            conn.execute('DELETE FROM outbox WHERE seq <= ?', (offset.last_seq,))
+            rows = conn.execute(
+                'SELECT seq, kind, payload FROM outbox ORDER BY seq LIMIT ?',
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                db.session.rollback()
+                conn.execute('COMMIT')
+                return 0, False
+
+            # Written first so the batch transaction is open before the
+            # savepoints below; on SQLite a leading SAVEPOINT would start
+            # (and its RELEASE commit) a transaction of its own.
+            offset.last_seq = rows[-1][0]
+            db.session.flush()
+
+            applied, failed, kinds = 0, [], set()
+            for seq, kind, payload in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(self.builders[kind](json.loads(payload)))
+                    applied += 1
+                    kinds.add(kind)
+                except Exception as e:
+                    failed.append(seq)
+                    db.session.add(WriteBehindDeadLetter(
+                        queue=self.name, seq=seq, kind=kind, payload=payload, error=f'{type(e).__name__}: {e}'
+                    ))
+            db.session.commit()
+
+            conn.execute('DELETE FROM outbox WHERE seq <= ?', (offset.last_seq,))
+            conn.execute('COMMIT')
+            for callback in self.committed_callbacks:
+                callback(kinds)
+            if failed:
+                self.app.logger.warning('Write-behind entries %s moved to dead letters', failed)
+            return applied, len(rows) == batch_size
+        except Exception:
+            db.session.rollback()
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def start(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        interval = self.app.config['WRITE_BEHIND_INTERVAL']
+        while True:
+            # Sleeping rather than waking per enqueue is what lets writes
+            # that arrive together share one commit.
+            time.sleep(interval)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Write-behind flush failed')